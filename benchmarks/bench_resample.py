@@ -0,0 +1,82 @@
+"""Compare the legacy weekly/monthly/yearly loops with finance_etl.resample.
+
+    python benchmarks/bench_resample.py --symbols 10000 --years 20
+
+Symbols are generated and timed in chunks so the full universe never has to
+be held in memory at once; the reported times are totals over all chunks.
+The engine is timed on the typed daily frames the DAG's transform_periods
+gets from normalize (resample_partitions); the legacy loops also parse the
+string bars they were written for.
+"""
+import argparse
+import os
+import sys
+import time
+
+import pandas as pd
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'dags'))
+
+import legacy_transforms
+import synthetic
+from finance_etl.resample import resample_partitions
+
+LEGACY = {
+    'weekly': legacy_transforms.transform_weekly,
+    'monthly': legacy_transforms.transform_monthly,
+    'yearly': legacy_transforms.transform_yearly,
+}
+
+
+def daily_partitions(data):
+    """(symbol, typed daily frame) pairs like normalize yields them, oldest bar first."""
+    partitions = []
+    for symbol, series in data.items():
+        dates = sorted(series)
+        frame = pd.DataFrame({'Date': pd.to_datetime(dates), 'Symbol': symbol})
+        for field in ['open', 'high', 'low', 'close']:
+            frame[field.capitalize()] = [float(series[date][field]) for date in dates]
+        frame['Volume'] = [int(series[date]['volume']) for date in dates]
+        partitions.append((symbol, frame))
+    return partitions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--symbols', type=int, default=10000)
+    parser.add_argument('--years', type=float, default=20)
+    parser.add_argument('--chunk', type=int, default=100, help='symbols generated and timed per chunk')
+    parser.add_argument('--skip-legacy', action='store_true')
+    args = parser.parse_args()
+
+    legacy_seconds = 0.0
+    engine_seconds = 0.0
+    rows = 0
+    for offset in range(0, args.symbols, args.chunk):
+        names = synthetic.symbol_names(min(args.chunk, args.symbols - offset), offset)
+        data = synthetic.joined_data(names, args.years, seed=offset)
+        rows += sum(len(series) for series in data.values())
+
+        if not args.skip_legacy:
+            start = time.perf_counter()
+            for transform in LEGACY.values():
+                transform(data)
+            legacy_seconds += time.perf_counter() - start
+
+        partitions = daily_partitions(data)
+        start = time.perf_counter()
+        resample_partitions(partitions, list(LEGACY))
+        engine_seconds += time.perf_counter() - start
+        print(f"\r{offset + len(names)}/{args.symbols} symbols", end='', file=sys.stderr)
+    print(file=sys.stderr)
+
+    print(f"daily rows:          {rows}")
+    if not args.skip_legacy:
+        print(f"legacy loops:        {legacy_seconds:.2f}s")
+    print(f"vectorized engine:   {engine_seconds:.2f}s")
+    if not args.skip_legacy and engine_seconds:
+        print(f"speedup:             {legacy_seconds / engine_seconds:.1f}x")
+
+
+if __name__ == '__main__':
+    main()
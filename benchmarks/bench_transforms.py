@@ -0,0 +1,109 @@
+"""Time and peak memory of every DAG transform stage on synthetic data, as a pytest-benchmark suite.
+
+    python -m pytest benchmarks/bench_transforms.py --symbols 500 --years 20
+    python -m pytest benchmarks/bench_transforms.py -k parquet --workers 4 --benchmark-json results.json
+    python -m pytest benchmarks/bench_transforms.py --benchmark-autosave --benchmark-compare
+
+pytest only collects this file when it is named, so a plain `python -m pytest`
+runs the tests alone.
+
+Stages run in DAG order, each on the output of the previous stage, which is
+computed once up front. The memory variants hand stages their input as
+in-memory pairs. The parquet variants read it from and write their output to
+Parquet stage artifacts like the Airflow tasks do, and --workers splits their
+symbols across that many processes (finance_etl.parallel). Timings come from
+pytest-benchmark (add --benchmark-timer=time.process_time for CPU time).
+Peak memory is what tracemalloc sees allocated by Python and numpy during
+one more, traced run of the stage; with workers it only covers the parent
+process. It is printed after the timings and kept in each benchmark's
+extra_info.
+"""
+import tracemalloc
+
+import pytest
+
+pytest.importorskip('pytest_benchmark')
+
+import synthetic  # noqa: E402
+from finance_etl.artifacts import write_stage  # noqa: E402
+from finance_etl.parallel import run_step  # noqa: E402
+from finance_etl.transforms import (raw_partitions, normalize_partitions, period_partitions,  # noqa: E402
+                                    indicator_partitions)
+
+
+def periods_step(partitions):
+    for period, rollup in period_partitions(partitions).items():
+        for symbol, frame in rollup:
+            yield f"{symbol}.{period}", frame
+
+
+# Stage name -> (input stage, step); each step maps (symbol, frame) pairs to (symbol, frame) pairs.
+# The raw stage converts the fetched payloads, so its step is built around them
+STAGES = {
+    'raw': (None, None),
+    'daily': ('raw', normalize_partitions),
+    'periods': ('daily', periods_step),
+    'indicators': ('daily', indicator_partitions),
+}
+
+
+def stage_step(stage, data):
+    return STAGES[stage][1] or (lambda _: raw_partitions(data))
+
+
+def run_stage(step, source, root=None, run_id=None, stage=None, workers=1):
+    """Run one step; `source` is a list of pairs in memory or a manifest when `root` is set. Returns (output, rows)."""
+    if root is None:
+        output = list(step(source))
+        return output, sum(len(frame) for _, frame in output)
+    if source is None:
+        manifest = write_stage(run_id, stage, step(None), root=root)
+    else:
+        manifest, _ = run_step(step, source, run_id, stage, workers=workers)
+    return manifest, manifest['rows']
+
+
+def peak_memory_mb(function):
+    # Traced separately: tracemalloc slows allocation-heavy code several times over
+    tracemalloc.start()
+    try:
+        function()
+        return tracemalloc.get_traced_memory()[1] / 2 ** 20
+    finally:
+        tracemalloc.stop()
+
+
+@pytest.fixture(scope='module')
+def data(pytestconfig):
+    symbols = synthetic.symbol_names(pytestconfig.getoption('symbols'))
+    return synthetic.raw_data(symbols, pytestconfig.getoption('years'), missing=pytestconfig.getoption('missing'))
+
+
+@pytest.fixture(scope='module')
+def inputs(data, tmp_path_factory):
+    """{'memory' | 'parquet': {stage: output}} of every stage, and the artifact root."""
+    root = str(tmp_path_factory.mktemp('artifacts'))
+    outputs = {'memory': {}, 'parquet': {}}
+    for stage, (source, _) in STAGES.items():
+        for io, outputs_io in outputs.items():
+            outputs_io[stage], _ = run_stage(stage_step(stage, data), outputs_io.get(source),
+                                             root if io == 'parquet' else None, 'inputs', stage)
+    return outputs, root
+
+
+@pytest.mark.parametrize('io', ['memory', 'parquet'])
+@pytest.mark.parametrize('stage', list(STAGES))
+def test_stage(benchmark, stage_memory, pytestconfig, data, inputs, stage, io):
+    outputs, root = inputs
+    source = outputs[io].get(STAGES[stage][0])
+    workers = pytestconfig.getoption('workers') if io == 'parquet' else 1
+    step = stage_step(stage, data)
+
+    def run():
+        return run_stage(step, source, root if io == 'parquet' else None, 'bench', stage, workers)
+
+    _, rows = benchmark(run)
+    benchmark.extra_info['rows'] = rows
+    benchmark.extra_info['peak_mb'] = peak_memory_mb(run)
+    stage_memory[benchmark.name] = (rows, benchmark.extra_info['peak_mb'])
+    assert rows > 0
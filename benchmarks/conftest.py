@@ -0,0 +1,38 @@
+"""Options of the pytest-benchmark suite and the peak memory report printed after its timings."""
+import os
+import sys
+
+import pytest
+
+BENCHMARKS_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path[:0] = [BENCHMARKS_DIR, os.path.join(BENCHMARKS_DIR, '..', 'dags')]
+
+STAGE_MEMORY = pytest.StashKey()
+
+
+def pytest_addoption(parser):
+    group = parser.getgroup('transform benchmarks')
+    group.addoption('--symbols', type=int, default=100, help='synthetic symbols (default 100)')
+    group.addoption('--years', type=float, default=20, help='years of daily bars per symbol (default 20)')
+    group.addoption('--missing', type=float, default=0.001, help='share of bars without a close (default 0.001)')
+    group.addoption('--workers', type=int, default=1,
+                    help='processes each Parquet stage is split across, like ETL_TRANSFORM_WORKERS (default 1)')
+
+
+def pytest_configure(config):
+    config.stash[STAGE_MEMORY] = {}
+
+
+@pytest.fixture
+def stage_memory(request):
+    """{benchmark name: (rows, peak MB)}, printed at the end of the session."""
+    return request.config.stash[STAGE_MEMORY]
+
+
+def pytest_terminal_summary(terminalreporter, config):
+    measured = config.stash.get(STAGE_MEMORY, {})
+    if not measured:
+        return
+    terminalreporter.section('peak memory per stage (tracemalloc)')
+    for name, (rows, peak_mb) in measured.items():
+        terminalreporter.write_line(f"{name:<40} {rows:>10} rows {peak_mb:>9.1f} MB peak")
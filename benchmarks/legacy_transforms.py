@@ -0,0 +1,228 @@
+"""The per-row transform loops the DAG used before finance_etl.resample, kept as a benchmark baseline."""
+import json
+from datetime import datetime, timedelta
+
+
+def transform_weekly(data: json):
+    def group_data_by_weeks(data):
+        grouped={}
+        for symbol in data.keys():
+            grouped_data = {}
+            for date_str, value in data[symbol].items():
+                date = datetime.strptime(date_str, '%Y-%m-%d')
+                week_start = date - timedelta(days=date.weekday())
+                week_end = week_start + timedelta(days=6)
+                week_label = f"{week_start.strftime('%Y-%m-%d')} to {week_end.strftime('%Y-%m-%d')}"
+                if week_label not in grouped_data:
+                    grouped_data[week_label] = []
+                grouped_data[week_label].append((date, value))
+            grouped[symbol]= grouped_data
+        return grouped
+    def calculate_weekly_summary(week_data):
+        weekly_open = float(week_data[-1][1]['open'])
+        weekly_close = float(week_data[0][1]['close'])
+        weekly_volume = sum(float(entry[1]['volume']) for entry in week_data)
+        weekly_high = max(float(entry[1]['high']) for entry in week_data)
+        weekly_low = min(float(entry[1]['low']) for entry in week_data)
+        comp_name = week_data[0][1]['Company Name']
+        market_cap = week_data[0][1]['Market Cap']
+        beta_5yr = week_data[0][1]['Beta (5Y Monthly)']
+        pe_ratio = week_data[0][1]['PE Ratio (TTM)']
+        eps = week_data[0][1]['EPS (TTM)']
+        earning_date = week_data[0][1]['Earnings Date']
+        fwd_div = week_data[0][1]['Forward Dividend & Yield']
+        ex_div = week_data[0][1]['Ex-Dividend Date']
+        tar_1y = week_data[0][1]['1y Target Est']
+        return {
+            'open': weekly_open,
+            'high': weekly_high,
+            'low': weekly_low,
+            'close': weekly_close,
+            'volume': weekly_volume,
+            'Company Name': comp_name,
+            'Market Cap': market_cap,
+            'Beta (5Y Monthly)': beta_5yr,
+            'PE Ratio (TTM)': pe_ratio,
+            'EPS (TTM)': eps,
+            'Earnings Date': earning_date,
+            'Forward Dividend & Yield': fwd_div,
+            'Ex-Dividend Date': ex_div,
+            '1y Target Est': tar_1y
+        }
+    weekly_data = group_data_by_weeks(data)
+    transformed_data = []
+    for symbol in weekly_data.keys():
+
+        for week_label, week_data in weekly_data[symbol].items():
+            weekly_summary = calculate_weekly_summary(week_data)
+            dat =  {
+                'Date': week_label,
+                'Symbol': symbol,
+                'Open': weekly_summary['open'],
+                'High': weekly_summary['high'],
+                'Close': weekly_summary['close'],
+                'Low': weekly_summary['low'],
+                'Volume': weekly_summary['volume'],
+                'Company Name': weekly_summary['Company Name'],
+                'Market Cap': weekly_summary['Market Cap'],
+                'Beta (5Y Monthly)': weekly_summary['Beta (5Y Monthly)'],
+                'PE Ratio (TTM)':weekly_summary['PE Ratio (TTM)'],
+                'EPS (TTM)': weekly_summary['EPS (TTM)'],
+                'Earnings Date': weekly_summary['Earnings Date'],
+                'Forward Dividend & Yield': weekly_summary['Forward Dividend & Yield'],
+                'Ex-Dividend Date': weekly_summary['Ex-Dividend Date'],
+                '1y Target Est': weekly_summary['1y Target Est']
+
+            }
+            transformed_data.append(dat)
+    return transformed_data
+
+
+def transform_monthly(data: json):
+    def group_data_by_months(data):
+        grouped = {}
+        for symbol in data.keys():
+            grouped_data = {}
+            for date_str, value in data[symbol].items():
+                date = datetime.strptime(date_str, '%Y-%m-%d')
+                month_start = date.replace(day=1)
+                month_end = month_start.replace(day=1, month=month_start.month % 12 + 1) - timedelta(days=1)
+                month_label = f"{month_start.strftime('%Y-%m-%d')} to {month_end.strftime('%Y-%m-%d')}"
+                if month_label not in grouped_data:
+                    grouped_data[month_label] = []
+                grouped_data[month_label].append((date, value))
+            grouped[symbol] = grouped_data
+        return grouped
+
+    def calculate_monthly_summary(month_data):
+        monthly_open = float(month_data[-1][1]['open'])
+        monthly_close = float(month_data[0][1]['close'])
+        monthly_volume = sum(float(entry[1]['volume']) for entry in month_data)
+        monthly_high = max(float(entry[1]['high']) for entry in month_data)
+        monthly_low = min(float(entry[1]['low']) for entry in month_data)
+        comp_name = month_data[0][1]['Company Name']
+        market_cap = month_data[0][1]['Market Cap']
+        beta_5yr = month_data[0][1]['Beta (5Y Monthly)']
+        pe_ratio = month_data[0][1]['PE Ratio (TTM)']
+        eps = month_data[0][1]['EPS (TTM)']
+        earning_date = month_data[0][1]['Earnings Date']
+        fwd_div = month_data[0][1]['Forward Dividend & Yield']
+        ex_div = month_data[0][1]['Ex-Dividend Date']
+        tar_1y = month_data[0][1]['1y Target Est']
+        return {
+            'open': monthly_open,
+            'high': monthly_high,
+            'low': monthly_low,
+            'close': monthly_close,
+            'volume': monthly_volume,
+            'Company Name': comp_name,
+            'Market Cap': market_cap,
+            'Beta (5Y Monthly)': beta_5yr,
+            'PE Ratio (TTM)': pe_ratio,
+            'EPS (TTM)': eps,
+            'Earnings Date': earning_date,
+            'Forward Dividend & Yield': fwd_div,
+            'Ex-Dividend Date': ex_div,
+            '1y Target Est': tar_1y
+        }
+
+    monthly_data = group_data_by_months(data)
+    transformed_data = []
+    for symbol in monthly_data.keys():
+        for month_label, month_data in monthly_data[symbol].items():
+            monthly_summary = calculate_monthly_summary(month_data)
+            dat = {
+                'Date': month_label,
+                'Symbol': symbol,
+                'Open': monthly_summary['open'],
+                'High': monthly_summary['high'],
+                'Close': monthly_summary['close'],
+                'Low': monthly_summary['low'],
+                'Volume': monthly_summary['volume'],
+                'Company Name': monthly_summary['Company Name'],
+                'Market Cap': monthly_summary['Market Cap'],
+                'Beta (5Y Monthly)': monthly_summary['Beta (5Y Monthly)'],
+                'PE Ratio (TTM)':monthly_summary['PE Ratio (TTM)'],
+                'EPS (TTM)': monthly_summary['EPS (TTM)'],
+                'Earnings Date': monthly_summary['Earnings Date'],
+                'Forward Dividend & Yield': monthly_summary['Forward Dividend & Yield'],
+                'Ex-Dividend Date': monthly_summary['Ex-Dividend Date'],
+                '1y Target Est': monthly_summary['1y Target Est']
+            }
+            transformed_data.append(dat)
+    return transformed_data
+
+
+def transform_yearly(data: json):
+    def group_data_by_years(data):
+        grouped = {}
+        for symbol in data.keys():
+            grouped_data = {}
+            for date_str, value in data[symbol].items():
+                date = datetime.strptime(date_str, '%Y-%m-%d')
+                year_start = date.replace(month=1, day=1)
+                year_end = year_start.replace(month=12, day=31)
+                year_label = f"{year_start.strftime('%Y-%m-%d')} to {year_end.strftime('%Y-%m-%d')}"
+                if year_label not in grouped_data:
+                    grouped_data[year_label] = []
+                grouped_data[year_label].append((date, value))
+            grouped[symbol] =  grouped_data
+        return grouped
+
+    def calculate_yearly_summary(year_data):
+        yearly_open = float(year_data[-1][1]['open'])
+        yearly_close = float(year_data[0][1]['close'])
+        yearly_volume = sum(float(entry[1]['volume']) for entry in year_data)
+        yearly_high = max(float(entry[1]['high']) for entry in year_data)
+        yearly_low = min(float(entry[1]['low']) for entry in year_data)
+        comp_name = year_data[0][1]['Company Name']
+        market_cap = year_data[0][1]['Market Cap']
+        beta_5yr = year_data[0][1]['Beta (5Y Monthly)']
+        pe_ratio = year_data[0][1]['PE Ratio (TTM)']
+        eps = year_data[0][1]['EPS (TTM)']
+        earning_date = year_data[0][1]['Earnings Date']
+        fwd_div = year_data[0][1]['Forward Dividend & Yield']
+        ex_div = year_data[0][1]['Ex-Dividend Date']
+        tar_1y = year_data[0][1]['1y Target Est']
+        return {
+            'open': yearly_open,
+            'high': yearly_high,
+            'low': yearly_low,
+            'close': yearly_close,
+            'volume': yearly_volume,
+            'Company Name': comp_name,
+            'Market Cap': market_cap,
+            'Beta (5Y Monthly)': beta_5yr,
+            'PE Ratio (TTM)': pe_ratio,
+            'EPS (TTM)': eps,
+            'Earnings Date': earning_date,
+            'Forward Dividend & Yield': fwd_div,
+            'Ex-Dividend Date': ex_div,
+            '1y Target Est': tar_1y
+        }
+
+    yearly_data = group_data_by_years(data)
+    transformed_data = []
+    for symbol in yearly_data.keys():
+        for year_label, year_data in yearly_data[symbol].items():
+            yearly_summary = calculate_yearly_summary(year_data)
+            dat = {
+                'Date': year_label,
+                'Symbol': symbol,
+                'Open': yearly_summary['open'],
+                'High': yearly_summary['high'],
+                'Close': yearly_summary['close'],
+                'Low': yearly_summary['low'],
+                'Volume': yearly_summary['volume'],
+                'Company Name': yearly_summary['Company Name'],
+                'Market Cap': yearly_summary['Market Cap'],
+                'Beta (5Y Monthly)': yearly_summary['Beta (5Y Monthly)'],
+                'PE Ratio (TTM)':yearly_summary['PE Ratio (TTM)'],
+                'EPS (TTM)': yearly_summary['EPS (TTM)'],
+                'Earnings Date': yearly_summary['Earnings Date'],
+                'Forward Dividend & Yield': yearly_summary['Forward Dividend & Yield'],
+                'Ex-Dividend Date': yearly_summary['Ex-Dividend Date'],
+                '1y Target Est': yearly_summary['1y Target Est']
+            }
+            transformed_data.append(dat)
+    return transformed_data
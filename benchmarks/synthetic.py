@@ -0,0 +1,91 @@
+"""Synthetic stock data shaped like Alpha Vantage responses and the DAG's intermediate payloads."""
+import random
+from datetime import date, timedelta
+
+SAMPLE_METADATA = {
+    'Company Name': 'Synthetic Corp. (SYN)',
+    'Market Cap': '1.234T',
+    'Beta (5Y Monthly)': '1.10',
+    'PE Ratio (TTM)': '25.40',
+    'EPS (TTM)': '6.12',
+    'Earnings Date': 'Jan 25, 2024',
+    'Forward Dividend & Yield': '0.96 (0.50%)',
+    'Ex-Dividend Date': 'Nov 10, 2023',
+    '1y Target Est': '210.00'
+}
+
+
+def trading_days(years, end=date(2024, 12, 31)):
+    """Weekdays covering `years` years up to `end`, newest first like Alpha Vantage."""
+    day = end
+    start = end - timedelta(days=int(years * 365.25))
+    days = []
+    while day > start:
+        if day.weekday() < 5:
+            days.append(day.strftime('%Y-%m-%d'))
+        day -= timedelta(days=1)
+    return days
+
+
+def symbol_names(count, offset=0):
+    return [f"S{index:05d}" for index in range(offset, offset + count)]
+
+
+def _bars(days, rng):
+    """(day, open, high, low, close, volume) newest first along a continuous random walk."""
+    price = rng.uniform(10, 500)
+    bars = []
+    # Walk oldest to newest so the price path is continuous, then emit newest first
+    for day in reversed(days):
+        open_ = price
+        close = max(1.0, open_ * (1 + rng.gauss(0, 0.02)))
+        high = max(open_, close) * (1 + abs(rng.gauss(0, 0.01)))
+        low = min(open_, close) * (1 - abs(rng.gauss(0, 0.01)))
+        bars.append((day, open_, high, low, close, rng.randint(100000, 50000000)))
+        price = close
+    return reversed(bars)
+
+
+def raw_series(days, seed=0, missing=0.0):
+    """One symbol's TIME_SERIES_DAILY payload; a `missing` share of bars lacks its close."""
+    rng = random.Random(seed)
+    series = {}
+    for day, open_, high, low, close, volume in _bars(days, rng):
+        bar = {
+            '1. open': f"{open_:.4f}",
+            '2. high': f"{high:.4f}",
+            '3. low': f"{low:.4f}",
+            '4. close': f"{close:.4f}",
+            '5. volume': str(volume)
+        }
+        if missing and rng.random() < missing:
+            del bar['4. close']
+        series[day] = bar
+    return series
+
+
+def raw_data(symbols, years, seed=0, missing=0.0):
+    """{symbol: series} as fetch_all returns it, for `years` of history per symbol."""
+    days = trading_days(years)
+    return {symbol: raw_series(days, seed + index, missing) for index, symbol in enumerate(symbols)}
+
+
+def joined_series(days, seed=0):
+    """One symbol's {date: bar} after rename_columns/join_data, as strings."""
+    rng = random.Random(seed)
+    series = {}
+    for day, open_, high, low, close, volume in _bars(days, rng):
+        series[day] = {
+            'open': f"{open_:.4f}",
+            'high': f"{high:.4f}",
+            'low': f"{low:.4f}",
+            'close': f"{close:.4f}",
+            'volume': str(volume),
+            **SAMPLE_METADATA
+        }
+    return series
+
+
+def joined_data(symbols, years, seed=0):
+    days = trading_days(years)
+    return {symbol: joined_series(days, seed + index) for index, symbol in enumerate(symbols)}
@@ -1,408 +1,339 @@
-import json
+import os
 import pendulum
-import requests
-from datetime import datetime,timedelta
-import pandas as pd
-from pymongo import MongoClient
-from bs4 import BeautifulSoup
 
 from airflow import Dataset
-from airflow.decorators import dag, task
+from airflow.decorators import dag, task, task_group
 
-symbols = ['AAPL', 'IBM', 'AMZN', 'MSFT', 'TSLA'] 
-client = MongoClient("mongodb+srv://<username>:<password>@<clustername>.mongodb.net/<database-name>?retryWrites=true&w=majority")
-db = client.get_database("finance_metadata")
-now = pendulum.now()
+# The scheduler re-parses this file constantly, so only modules without pandas, pyarrow or BeautifulSoup
+# are imported here; tasks import the rest when they run
+from finance_etl import metrics
+from finance_etl.config import INDICATOR_COLLECTION, PERIODS, load_symbols, shard_symbols
+from finance_etl.metrics import instrumented, sink_from_env
+from finance_etl.mongo import get_database
 
+# Symbols come from ETL_SYMBOLS or the symbols collection (see finance_etl.config)
+# and are processed in independent shards of this size
+SHARD_SIZE = int(os.environ.get('ETL_SHARD_SIZE', 25))
+# Where prices and metadata come from, see finance_etl.providers: e.g. replay:/data/fixtures or bulk:/data/eod.parquet
+PRICE_PROVIDER = os.environ.get('ETL_PRICE_PROVIDER', 'alphavantage')
+METADATA_PROVIDER = os.environ.get('ETL_METADATA_PROVIDER', 'yahoo')
+# When set, whatever the providers return is also recorded there as replay fixtures
+RECORD_FIXTURES_DIR = os.environ.get('ETL_RECORD_FIXTURES')
+ALPHA_VANTAGE_API_KEY = "xxxxxx"
+# Free tier quota is 5 requests per minute; raise both for premium keys
+ALPHA_VANTAGE_CALLS_PER_MINUTE = 5
+EXTRACT_WORKERS = 4
+METADATA_WORKERS = 4
+# Quote pages are revalidated at most this often
+METADATA_TTL_SECONDS = 6 * 3600
+# Processes the normalize, period and indicator transforms of a shard are split across; 1 runs them in the task
+TRANSFORM_WORKERS = int(os.environ.get('ETL_TRANSFORM_WORKERS', 1))
+LOAD_BATCH_SIZE = 1000
+# New and rebuilt stocks_* collections become Mongo time-series collections (MongoDB 7.0.3+)
+TIMESERIES_COLLECTIONS = os.environ.get('ETL_TIMESERIES_COLLECTIONS') == '1'
+LOAD_WORKERS = 4
+# When set, every run ends by publishing Arrow snapshot files there for the dashboard (same ETL_SNAPSHOT_DIR)
+SNAPSHOT_DIR = os.environ.get('ETL_SNAPSHOT_DIR')
+# Task telemetry goes to etl_task_metrics, or to Prometheus textfiles when ETL_METRICS_TEXTFILE_DIR is set
+metrics_sink = sink_from_env(get_database)
+LOADED_COLLECTIONS = ['stocks_daily'] + [f'stocks_{period}' for period in PERIODS] + [INDICATOR_COLLECTION]
 
-@dag(start_date=now, schedule="@daily", catchup=False)
-def etl_finance_meta():
-    @task()
-    def extract():
-        data_finance = {}
-        for symbol in symbols:
-            url = f'https://www.alphavantage.co/query'
-            params = {
-            'function': 'TIME_SERIES_DAILY',
-            'symbol': symbol,
-            'outputsize':'full',  
-            'apikey': "xxxxxx"
-            }
-            response = requests.get(url, params=params)
-            if response.status_code == 200:
-                data = response.json()
-                if 'Time Series (Daily)' in data:
-                    data_finance[symbol] = data['Time Series (Daily)']
-                else:
-                    print(f"No intraday data available for {symbol}")
-                    return None
-            else:
-                print(f"Failed to retrieve intraday data for {symbol}")
-                return None
-        return data_finance
-    @task()
-    def get_company_metadata():
-        meta = {}
-        for symbol in symbols:
-            url = f'https://finance.yahoo.com/quote/{symbol}/'
-            response = requests.get(url)
-            if response.status_code == 200:
-                soup = BeautifulSoup(response.content, 'html.parser')
-                metadata = {}
-                company_name = soup.find('h1', class_='D(ib) Fz(18px)').text.strip()
-                metadata['Company Name'] = company_name
-                summary_table = soup.find('table', class_='W(100%) M(0) Bdcl(c)')
-                if summary_table:
-                    rows = summary_table.find_all('tr')
-                    for row in rows:
-                        cells = row.find_all('td')
-                        if len(cells) == 2:
-                            label = cells[0].text.strip()
-                            value = cells[1].text.strip()
-                            metadata[label] = value
-                meta[symbol] = metadata
-            else:
-                print(f"Failed to retrieve metadata for {symbol}")
-                meta[symbol] = None
-        return meta
 
-    @task()
-    def rename_columns(data: json):
-        rename = {}
-        for key in data.keys():
-            renamed_data = {}
-            for date_str, value in data[key].items():
-                renamed_value = {
-                    'open': value['1. open'],
-                    'high': value['2. high'],
-                    'low': value['3. low'],
-                    'close': value['4. close'],
-                    'volume': value['5. volume']
-                }
-                renamed_data[date_str] = renamed_value
-            rename[key] =  renamed_data
-        return rename
-    
-    @task()
-    def join_data(alpha_vantage_data, yahoo_metadata):
-        if alpha_vantage_data is None or yahoo_metadata is None:
-            return None
-        
-        joined={}
-        for symbol in symbols:
-            joined_data = {}
-            for timestamp, value in alpha_vantage_data[symbol].items():
-                joined_entry = {}
-                joined_entry.update(value)
-                joined_entry.update(yahoo_metadata[symbol])
-                joined_data[timestamp] = joined_entry
-            
-            joined[symbol]= joined_data
-        return joined
+def shard_key(run_id, index):
+    # Each shard keeps its stage files under its own directory of the run
+    return f"{run_id}_shard{index}"
 
 
+def artifact_key(ti):
+    return shard_key(ti.run_id, ti.map_index)
 
-    @task()
-    def clean_data(data: json):
-        clean = {}
-        for key in data.keys():
-            cleaned_data = {}
-            for date_str, value in data[key].items():
-                if all(key1 in value for key1 in ['1. open', '2. high', '3. low', '4. close', '5. volume']):
-                    cleaned_data[date_str] = value
-            clean[key] =  cleaned_data
-        return clean
 
-    @task()
-    def transform_weekly(data: json):
-        def group_data_by_weeks(data):
-            grouped={}
-            for symbol in data.keys():
-                grouped_data = {}
-                for date_str, value in data[symbol].items():
-                    date = datetime.strptime(date_str, '%Y-%m-%d')
-                    week_start = date - timedelta(days=date.weekday())
-                    week_end = week_start + timedelta(days=6)
-                    week_label = f"{week_start.strftime('%Y-%m-%d')} to {week_end.strftime('%Y-%m-%d')}"
-                    if week_label not in grouped_data:
-                        grouped_data[week_label] = []
-                    grouped_data[week_label].append((date, value))
-                grouped[symbol]= grouped_data
-            return grouped
-        def calculate_weekly_summary(week_data):
-            weekly_open = float(week_data[-1][1]['open'])
-            weekly_close = float(week_data[0][1]['close'])
-            weekly_volume = sum(float(entry[1]['volume']) for entry in week_data)
-            weekly_high = max(float(entry[1]['high']) for entry in week_data)
-            weekly_low = min(float(entry[1]['low']) for entry in week_data)
-            comp_name = week_data[0][1]['Company Name']
-            market_cap = week_data[0][1]['Market Cap']
-            beta_5yr = week_data[0][1]['Beta (5Y Monthly)']
-            pe_ratio = week_data[0][1]['PE Ratio (TTM)']
-            eps = week_data[0][1]['EPS (TTM)']
-            earning_date = week_data[0][1]['Earnings Date']
-            fwd_div = week_data[0][1]['Forward Dividend & Yield']
-            ex_div = week_data[0][1]['Ex-Dividend Date']
-            tar_1y = week_data[0][1]['1y Target Est']
-            return {
-                'open': weekly_open,
-                'high': weekly_high,
-                'low': weekly_low,
-                'close': weekly_close,
-                'volume': weekly_volume,
-                'Company Name': comp_name,
-                'Market Cap': market_cap,
-                'Beta (5Y Monthly)': beta_5yr,
-                'PE Ratio (TTM)': pe_ratio,
-                'EPS (TTM)': eps,
-                'Earnings Date': earning_date,
-                'Forward Dividend & Yield': fwd_div,
-                'Ex-Dividend Date': ex_div,
-                '1y Target Est': tar_1y
-            }
-        weekly_data = group_data_by_weeks(data)
-        transformed_data = []
-        for symbol in weekly_data.keys():
+def bulk_shard_file(run_id, index):
+    from finance_etl.artifacts import run_file
+    # Each shard's rows of a bulk dump, split out by plan_shards
+    return run_file(f"{run_id}_bulk", f"shard{index}.parquet")
 
-            for week_label, week_data in weekly_data[symbol].items():
-                weekly_summary = calculate_weekly_summary(week_data)
-                dat =  {
-                    'Date': week_label,
-                    'Symbol': symbol,
-                    'Open': weekly_summary['open'],
-                    'High': weekly_summary['high'],
-                    'Close': weekly_summary['close'],
-                    'Low': weekly_summary['low'],
-                    'Volume': weekly_summary['volume'],
-                    'Company Name': weekly_summary['Company Name'],
-                    'Market Cap': weekly_summary['Market Cap'],
-                    'Beta (5Y Monthly)': weekly_summary['Beta (5Y Monthly)'],
-                    'PE Ratio (TTM)':weekly_summary['PE Ratio (TTM)'],
-                    'EPS (TTM)': weekly_summary['EPS (TTM)'],
-                    'Earnings Date': weekly_summary['Earnings Date'],
-                    'Forward Dividend & Yield': weekly_summary['Forward Dividend & Yield'],
-                    'Ex-Dividend Date': weekly_summary['Ex-Dividend Date'],
-                    '1y Target Est': weekly_summary['1y Target Est']
 
-                }
-                transformed_data.append(dat)
-        return transformed_data
+def full_refresh_requested(params):
+    return bool(params and params.get('full_refresh'))
 
+
+# A fixed start date keeps parsing deterministic; with catchup off only the latest interval runs
+@dag(start_date=pendulum.datetime(2024, 1, 1, tz='UTC'), schedule="@daily", catchup=False,
+     params={"full_refresh": False})
+def etl_finance_meta():
     @task()
-    def transform_monthly(data: json):
-        def group_data_by_months(data):
-            grouped = {}
-            for symbol in data.keys():
-                grouped_data = {}
-                for date_str, value in data[symbol].items():
-                    date = datetime.strptime(date_str, '%Y-%m-%d')
-                    month_start = date.replace(day=1)
-                    month_end = month_start.replace(day=1, month=month_start.month % 12 + 1) - timedelta(days=1)
-                    month_label = f"{month_start.strftime('%Y-%m-%d')} to {month_end.strftime('%Y-%m-%d')}"
-                    if month_label not in grouped_data:
-                        grouped_data[month_label] = []
-                    grouped_data[month_label].append((date, value))
-                grouped[symbol] = grouped_data
-            return grouped
+    @instrumented(metrics_sink)
+    def plan_shards(params=None, run_id=None):
+        from finance_etl.load import drop_staging, ensure_collection, staging_name
+        from finance_etl.providers import BulkFileProvider
+        db = get_database()
+        symbols = load_symbols(db)
+        for name in LOADED_COLLECTIONS:
+            ensure_collection(db, name, TIMESERIES_COLLECTIONS)
+        if full_refresh_requested(params):
+            # Shards stage their documents; record_run publishes them once all shards are done
+            for name in LOADED_COLLECTIONS:
+                drop_staging(db, name)
+                ensure_collection(db, staging_name(name), TIMESERIES_COLLECTIONS)
+        shards = shard_symbols(symbols, SHARD_SIZE)
+        print(f"{len(symbols)} symbols in {len(shards)} shards")
+        kind, _, location = PRICE_PROVIDER.partition(':')
+        if kind == 'bulk':
+            # The dump is read once here instead of once per shard
+            BulkFileProvider(location).split(shards, [bulk_shard_file(run_id, index) for index in range(len(shards))])
+        return shards
 
-        def calculate_monthly_summary(month_data):
-            monthly_open = float(month_data[-1][1]['open'])
-            monthly_close = float(month_data[0][1]['close'])
-            monthly_volume = sum(float(entry[1]['volume']) for entry in month_data)
-            monthly_high = max(float(entry[1]['high']) for entry in month_data)
-            monthly_low = min(float(entry[1]['low']) for entry in month_data)
-            comp_name = month_data[0][1]['Company Name']
-            market_cap = month_data[0][1]['Market Cap']
-            beta_5yr = month_data[0][1]['Beta (5Y Monthly)']
-            pe_ratio = month_data[0][1]['PE Ratio (TTM)']
-            eps = month_data[0][1]['EPS (TTM)']
-            earning_date = month_data[0][1]['Earnings Date']
-            fwd_div = month_data[0][1]['Forward Dividend & Yield']
-            ex_div = month_data[0][1]['Ex-Dividend Date']
-            tar_1y = month_data[0][1]['1y Target Est']
-            return {
-                'open': monthly_open,
-                'high': monthly_high,
-                'low': monthly_low,
-                'close': monthly_close,
-                'volume': monthly_volume,
-                'Company Name': comp_name,
-                'Market Cap': market_cap,
-                'Beta (5Y Monthly)': beta_5yr,
-                'PE Ratio (TTM)': pe_ratio,
-                'EPS (TTM)': eps,
-                'Earnings Date': earning_date,
-                'Forward Dividend & Yield': fwd_div,
-                'Ex-Dividend Date': ex_div,
-                '1y Target Est': tar_1y
-            }
+    @task()
+    @instrumented(metrics_sink)
+    def extract(shard: list, params=None, ti=None):
+        from finance_etl.artifacts import write_stage
+        from finance_etl.indicators import last_indicator_rows, lookback
+        from finance_etl.load import stored_symbols
+        from finance_etl.providers import price_provider
+        from finance_etl.transforms import raw_partitions
+        from finance_etl.watermarks import get_watermarks, load_history, merge_history
+        # Incremental by default; trigger with {"full_refresh": true} to refetch and rebuild everything
+        db = get_database()
+        full_refresh = full_refresh_requested(params)
+        watermarks = {} if full_refresh else get_watermarks(db, shard)
+        spec = PRICE_PROVIDER
+        if spec.startswith('bulk:'):
+            spec = f"bulk:{bulk_shard_file(ti.run_id, ti.map_index)}"
+        provider = price_provider(
+            spec,
+            record_dir=RECORD_FIXTURES_DIR,
+            api_key=ALPHA_VANTAGE_API_KEY,
+            max_workers=EXTRACT_WORKERS,
+            calls_per_minute=ALPHA_VANTAGE_CALLS_PER_MINUTE,
+        )
+        data_finance, errors, modes = provider.fetch_daily(shard, watermarks)
+        for symbol, error in errors.items():
+            print(f"Failed to retrieve daily data for {symbol}: {error}")
+        if not data_finance:
+            raise ValueError("No daily data retrieved for any symbol")
+        incremental = [symbol for symbol, mode in modes.items() if mode == 'incremental']
+        # New bars only need the stored bars before them that the indicator windows read. A symbol without
+        # indicator rows yet, or missing from a period collection (a new period or a dropped collection),
+        # gets its whole history so those are computed from every bar
+        indicator_states = last_indicator_rows(db, incremental)
+        rolled_up = [stored_symbols(db, f'stocks_{period}', incremental) for period in PERIODS]
+        for symbol, mode in modes.items():
+            if mode == 'incremental':
+                new_bars = len(data_finance[symbol])
+                state = indicator_states.get(symbol)
+                since = state['Date'] if state and all(symbol in held for held in rolled_up) else None
+                history = load_history(db, symbol, since=since, context=lookback())
+                data_finance[symbol] = merge_history(history, data_finance[symbol])
+                print(f"{symbol}: {new_bars} new bars after {watermarks[symbol]}")
+            else:
+                print(f"{symbol}: full history, {len(data_finance[symbol])} bars")
+        manifest = write_stage(artifact_key(ti), 'raw', raw_partitions(data_finance))
+        # Rows up to these dates are context already stored in stocks_daily; they are neither fingerprinted nor loaded
+        manifest['watermarks'] = {symbol: watermarks[symbol] for symbol in incremental}
+        return manifest
 
-        monthly_data = group_data_by_months(data)
-        transformed_data = []
-        for symbol in monthly_data.keys():
-            for month_label, month_data in monthly_data[symbol].items():
-                monthly_summary = calculate_monthly_summary(month_data)
-                dat = {
-                    'Date': month_label,
-                    'Symbol': symbol,
-                    'Open': monthly_summary['open'],
-                    'High': monthly_summary['high'],
-                    'Close': monthly_summary['close'],
-                    'Low': monthly_summary['low'],
-                    'Volume': monthly_summary['volume'],
-                    'Company Name': monthly_summary['Company Name'],
-                    'Market Cap': monthly_summary['Market Cap'],
-                    'Beta (5Y Monthly)': monthly_summary['Beta (5Y Monthly)'],
-                    'PE Ratio (TTM)':monthly_summary['PE Ratio (TTM)'],
-                    'EPS (TTM)': monthly_summary['EPS (TTM)'],
-                    'Earnings Date': monthly_summary['Earnings Date'],
-                    'Forward Dividend & Yield': monthly_summary['Forward Dividend & Yield'],
-                    'Ex-Dividend Date': monthly_summary['Ex-Dividend Date'],
-                    '1y Target Est': monthly_summary['1y Target Est']
-                }
-                transformed_data.append(dat)
-        return transformed_data
+    @task()
+    @instrumented(metrics_sink)
+    def get_company_metadata(shard: list):
+        from finance_etl.providers import metadata_provider
+        provider = metadata_provider(METADATA_PROVIDER, record_dir=RECORD_FIXTURES_DIR,
+                                     max_workers=METADATA_WORKERS, ttl=METADATA_TTL_SECONDS)
+        return provider.fetch_metadata(shard)
 
-    
     @task()
-    def transform_yearly(data: json):
-        def group_data_by_years(data):
-            grouped = {}
-            for symbol in data.keys():
-                grouped_data = {}
-                for date_str, value in data[symbol].items():
-                    date = datetime.strptime(date_str, '%Y-%m-%d')
-                    year_start = date.replace(month=1, day=1)
-                    year_end = year_start.replace(month=12, day=31)
-                    year_label = f"{year_start.strftime('%Y-%m-%d')} to {year_end.strftime('%Y-%m-%d')}"
-                    if year_label not in grouped_data:
-                        grouped_data[year_label] = []
-                    grouped_data[year_label].append((date, value))
-                grouped[symbol] =  grouped_data
-            return grouped
+    @instrumented(metrics_sink)
+    def load_company_metadata(yahoo_metadata):
+        from finance_etl.fingerprints import fields_fingerprint, get_fingerprints, set_fingerprints
+        from finance_etl.metadata import save_company_metadata
+        # Stored once per symbol; price documents stay slim and are joined on read
+        db = get_database()
+        fingerprints = {symbol: fields_fingerprint(fields) for symbol, fields in yahoo_metadata.items() if fields}
+        stored = get_fingerprints(db, fingerprints, 'metadata')
+        changed = {symbol: yahoo_metadata[symbol] for symbol in fingerprints if fingerprints[symbol] != stored.get(symbol)}
+        saved = save_company_metadata(db, changed)
+        set_fingerprints(db, {symbol: fingerprints[symbol] for symbol in changed}, 'metadata')
+        print(f"Saved metadata for {saved} symbols, {len(fingerprints) - saved} unchanged")
 
-        def calculate_yearly_summary(year_data):
-            yearly_open = float(year_data[-1][1]['open'])
-            yearly_close = float(year_data[0][1]['close'])
-            yearly_volume = sum(float(entry[1]['volume']) for entry in year_data)
-            yearly_high = max(float(entry[1]['high']) for entry in year_data)
-            yearly_low = min(float(entry[1]['low']) for entry in year_data)
-            comp_name = year_data[0][1]['Company Name']
-            market_cap = year_data[0][1]['Market Cap']
-            beta_5yr = year_data[0][1]['Beta (5Y Monthly)']
-            pe_ratio = year_data[0][1]['PE Ratio (TTM)']
-            eps = year_data[0][1]['EPS (TTM)']
-            earning_date = year_data[0][1]['Earnings Date']
-            fwd_div = year_data[0][1]['Forward Dividend & Yield']
-            ex_div = year_data[0][1]['Ex-Dividend Date']
-            tar_1y = year_data[0][1]['1y Target Est']
-            return {
-                'open': yearly_open,
-                'high': yearly_high,
-                'low': yearly_low,
-                'close': yearly_close,
-                'volume': yearly_volume,
-                'Company Name': comp_name,
-                'Market Cap': market_cap,
-                'Beta (5Y Monthly)': beta_5yr,
-                'PE Ratio (TTM)': pe_ratio,
-                'EPS (TTM)': eps,
-                'Earnings Date': earning_date,
-                'Forward Dividend & Yield': fwd_div,
-                'Ex-Dividend Date': ex_div,
-                '1y Target Est': tar_1y
-            }
+    @task(multiple_outputs=True)
+    @instrumented(metrics_sink)
+    def transform_periods(manifest: dict, params=None, ti=None):
+        from finance_etl.load import latest_by_symbol
+        from finance_etl.parallel import run_step
+        from finance_etl.transforms import period_partitions
+        # Incremental runs fold the new bars into each symbol's stored open period; only changed periods are loaded.
+        # Symbols without a stored period were extracted with their whole history, which is rolled up instead
+        db = get_database()
+        states = None
+        if not full_refresh_requested(params):
+            states = {period: latest_by_symbol(db, f'stocks_{period}', manifest['symbols']) for period in PERIODS}
+            # Periods stored before LastDate was kept hold every bar up to the symbol's watermark
+            for state in states.values():
+                for symbol, doc in state.items():
+                    if doc.get('LastDate') is None:
+                        doc['LastDate'] = manifest['watermarks'].get(symbol)
+        rollups, _ = run_step(period_partitions, manifest, artifact_key(ti), workers=TRANSFORM_WORKERS, states=states)
+        return rollups
 
-        yearly_data = group_data_by_years(data)
-        transformed_data = []
-        for symbol in yearly_data.keys():
-            for year_label, year_data in yearly_data[symbol].items():
-                yearly_summary = calculate_yearly_summary(year_data)
-                dat = {
-                    'Date': year_label,
-                    'Symbol': symbol,
-                    'Open': yearly_summary['open'],
-                    'High': yearly_summary['high'],
-                    'Close': yearly_summary['close'],
-                    'Low': yearly_summary['low'],
-                    'Volume': yearly_summary['volume'],
-                    'Company Name': yearly_summary['Company Name'],
-                    'Market Cap': yearly_summary['Market Cap'],
-                    'Beta (5Y Monthly)': yearly_summary['Beta (5Y Monthly)'],
-                    'PE Ratio (TTM)':yearly_summary['PE Ratio (TTM)'],
-                    'EPS (TTM)': yearly_summary['EPS (TTM)'],
-                    'Earnings Date': yearly_summary['Earnings Date'],
-                    'Forward Dividend & Yield': yearly_summary['Forward Dividend & Yield'],
-                    'Ex-Dividend Date': yearly_summary['Ex-Dividend Date'],
-                    '1y Target Est': yearly_summary['1y Target Est']
-                }
-                transformed_data.append(dat)
-        return transformed_data
+    @task()
+    @instrumented(metrics_sink)
+    def normalize(manifest: dict, params=None, ti=None):
+        from finance_etl.extract import RAW_FIELDS
+        from finance_etl.fingerprints import get_fingerprints
+        from finance_etl.parallel import run_step
+        from finance_etl.quarantine import quarantine_rows
+        from finance_etl.transforms import normalize_changed
+        # Validation, renaming and typing in one pass; rejected rows go to etl_quarantine.
+        # Symbols whose bars match the fingerprint of their last load are left out of every later stage
+        db = get_database()
+        stored = {} if full_refresh_requested(params) else get_fingerprints(db, manifest['symbols'])
+        daily, report = run_step(normalize_changed, manifest, artifact_key(ti), 'daily', columns=['Date'] + RAW_FIELDS,
+                                 workers=TRANSFORM_WORKERS, report=True, stored=stored,
+                                 watermarks=manifest['watermarks'])
+        quarantined = {}
+        for symbol, rows in report.get('rejected', {}).items():
+            quarantined[symbol] = quarantine_rows(db, ti.run_id, symbol, rows)
+            print(f"{symbol}: quarantined {quarantined[symbol]} rows")
+        fingerprints = report.get('fingerprints', {})
+        # Fingerprints are only stored by record_run, once the shard's loads have succeeded
+        daily['fingerprints'] = {symbol: fingerprints[symbol] for symbol in daily['symbols']}
+        daily['unchanged'] = [symbol for symbol in fingerprints if symbol not in daily['fingerprints']]
+        daily['watermarks'] = {symbol: manifest['watermarks'][symbol] for symbol in daily['symbols']
+                               if symbol in manifest['watermarks']}
+        if daily['unchanged']:
+            print(f"Unchanged since the last load, skipped: {daily['unchanged']}")
+        metrics.add('rows_quarantined', sum(quarantined.values()))
+        metrics.add('symbols_unchanged', len(daily['unchanged']))
+        return daily
 
     @task()
-    def transform_daily(data: json):
-        formatted_data = []
-        for symbol in data.keys():
-            for date, data_point in data[symbol].items():
-                formatted_data.append(
-                        {
-                            'Date': date,
-                            'Symbol': symbol,
-                            'Open': float(data_point['open']),
-                            'High': float(data_point['high']),
-                            'Low': float(data_point['low']),
-                            'Close': float(data_point['close']),
-                            'Volume': int(data_point['volume']),
-                            'Company Name': data_point['Company Name'],
-                            'Market Cap': data_point['Market Cap'],
-                            'Beta (5Y Monthly)': data_point['Beta (5Y Monthly)'],
-                            'PE Ratio (TTM)':data_point['PE Ratio (TTM)'],
-                            'EPS (TTM)': data_point['EPS (TTM)'],
-                            'Earnings Date': data_point['Earnings Date'],
-                            'Forward Dividend & Yield': data_point['Forward Dividend & Yield'],
-                            'Ex-Dividend Date': data_point['Ex-Dividend Date'],
-                            '1y Target Est': data_point['1y Target Est']
-                        }
-                )
-        return formatted_data
+    @instrumented(metrics_sink)
+    def transform_indicators(manifest: dict, params=None, ti=None):
+        from finance_etl.indicators import last_indicator_rows
+        from finance_etl.parallel import run_step
+        from finance_etl.transforms import indicator_partitions
+        # Only bars after each symbol's last stored indicator row are computed
+        db = get_database()
+        states = {} if full_refresh_requested(params) else last_indicator_rows(db, manifest['symbols'])
+        indicators, _ = run_step(indicator_partitions, manifest, artifact_key(ti), 'indicators',
+                                 workers=TRANSFORM_WORKERS, states=states)
+        return indicators
 
     @task()
-    def load_daily(data: json):
-        records = db.stocks_daily
-        records.delete_many({})
-        records.insert_many(data)
+    @instrumented(metrics_sink)
+    def load_daily(manifest: dict, params=None):
+        from finance_etl.artifacts import iter_records
+        from finance_etl.load import load_records
+        db = get_database()
+        # Only the bars after each symbol's watermark are new; the rest were read back as context
+        records = iter_records(manifest, after=manifest['watermarks'])
+        load_records(db, 'stocks_daily', records, full_refresh=full_refresh_requested(params),
+                     batch_size=LOAD_BATCH_SIZE, max_workers=LOAD_WORKERS, timeseries=TIMESERIES_COLLECTIONS)
 
     @task()
-    def load_weekly(data: json):
-        records = db.stocks_weekly
-        records.delete_many({})
-        records.insert_many(data)
+    @instrumented(metrics_sink)
+    def load_period(manifest: dict, period: str, params=None):
+        from finance_etl.artifacts import iter_records
+        from finance_etl.load import load_records
+        db = get_database()
+        load_records(db, f'stocks_{period}', iter_records(manifest), full_refresh=full_refresh_requested(params),
+                     batch_size=LOAD_BATCH_SIZE, max_workers=LOAD_WORKERS, timeseries=TIMESERIES_COLLECTIONS)
 
     @task()
-    def load_monthly(data: json):
-        records = db.stocks_monthly
-        records.delete_many({})
-        records.insert_many(data)
+    @instrumented(metrics_sink)
+    def finish_shard(manifest: dict, daily: dict, ti=None):
+        from finance_etl.artifacts import iter_stage, remove_run
+        # Only reached when every load of the shard succeeded; failed shards keep their artifacts for retries
+        # until record_run
+        last_dates = {symbol: frame['Date'].max() for symbol, frame in iter_stage(manifest, columns=['Date'])
+                      if not frame.empty}
+        remove_run(artifact_key(ti))
+        # Watermarks and fingerprints are stored by record_run, once it is known whether the loads are published
+        return {'symbols': manifest['symbols'], 'unchanged': daily['unchanged'], 'fingerprints': daily['fingerprints'],
+                'watermarks': last_dates}
+
+    @task(trigger_rule='all_done')
+    @instrumented(metrics_sink)
+    def record_run(shards: list, loaded_shards, params=None, run_id=None):
+        from finance_etl.artifacts import remove_run
+        from finance_etl.fingerprints import set_fingerprints
+        from finance_etl.load import bump_load_generation, drop_staging, publish_staging
+        from finance_etl.watermarks import set_watermarks
+        db = get_database()
+        symbols = [symbol for shard in shards for symbol in shard]
+        loaded_shards = [shard for shard in loaded_shards if shard]
+        loaded = {symbol for shard in loaded_shards for symbol in shard['symbols']}
+        unchanged = sorted(symbol for shard in loaded_shards for symbol in shard['unchanged'])
+        missing = [symbol for symbol in symbols if symbol not in loaded]
+        complete = not missing
+        if full_refresh_requested(params):
+            for name in LOADED_COLLECTIONS:
+                if complete:
+                    publish_staging(db, name, TIMESERIES_COLLECTIONS)
+                else:
+                    drop_staging(db, name)
+            print("Published rebuilt collections" if complete else "Incomplete rebuild, live collections kept")
+        # A rebuild that is not published leaves the previously loaded data, watermarks and fingerprints in place
+        if complete or not full_refresh_requested(params):
+            set_watermarks(db, {symbol: last_date for shard in loaded_shards
+                                for symbol, last_date in shard['watermarks'].items()})
+            set_fingerprints(db, {symbol: fingerprint for shard in loaded_shards
+                                  for symbol, fingerprint in shard['fingerprints'].items()})
+        db.etl_runs.replace_one({'_id': run_id}, {
+            '_id': run_id,
+            'finished_at': pendulum.now('UTC'),
+            'shards': len(shards),
+            'symbols': len(symbols),
+            'loaded': len(loaded),
+            # Loaded symbols whose data had not changed and skipped transform and load
+            'unchanged': len(unchanged),
+            'missing': missing,
+            'complete': complete
+        }, upsert=True)
+        bump_load_generation(db, run_id)
+        # Every shard is done by now, so the stages failed shards left behind are of no more use
+        for index in range(len(shards)):
+            remove_run(shard_key(run_id, index))
+        if PRICE_PROVIDER.startswith('bulk:'):
+            # The split dump only serves this run's extracts
+            remove_run(f"{run_id}_bulk")
+        print(f"Loaded {len(loaded)}/{len(symbols)} symbols ({len(unchanged)} unchanged, skipped); missing: {missing}")
+        # Symbols whose live documents this run rewrote; None when everything was rebuilt
+        if full_refresh_requested(params):
+            return {'changed': None if complete else []}
+        return {'changed': sorted(loaded.difference(unchanged))}
 
     @task()
-    def load_yearly(data: json):
-        records = db.stocks_yearly
-        records.delete_many({})
-        records.insert_many(data)
+    @instrumented(metrics_sink)
+    def publish_snapshots(summary: dict, run_id=None):
+        from finance_etl.snapshots import publish_snapshot
+        # Mongo stays the system of record; the dashboard serves its reads from these files
+        if not SNAPSHOT_DIR:
+            print("ETL_SNAPSHOT_DIR is not set, no snapshot published")
+            return None
+        published = publish_snapshot(get_database(), SNAPSHOT_DIR, run_id, summary['changed'])
+        metrics.add('snapshot_files_written', published['written'])
+        metrics.add('snapshot_files_linked', published['linked'])
+        return published
+
+    @task_group()
+    def process_shard(shard: list):
+        daily_data = extract(shard)
+        get_metadata = get_company_metadata(shard)
+        load_company_metadata(get_metadata)
+        daily_data_transformed = normalize(daily_data)
+        loads = [load_daily(daily_data_transformed)]
+        period_data = transform_periods(daily_data_transformed)
+        for period in PERIODS:
+            loads.append(load_period.override(task_id=f'load_{period}')(period_data[period], period))
+        indicators = transform_indicators(daily_data_transformed)
+        loads.append(load_period.override(task_id='load_indicators')(indicators, 'indicators'))
+        finished = finish_shard(daily_data, daily_data_transformed)
+        loads >> finished
+        return finished
 
-    daily_data = extract()
-    cleaned_data=clean_data(daily_data)
-    renamed_columns=rename_columns(cleaned_data)
-    get_metadata = get_company_metadata()
-    final_data = join_data(renamed_columns,get_metadata)
-    daily_data_transformed=transform_daily(final_data)
-    load_daily(daily_data_transformed)
-    weekly_data = transform_weekly(final_data)
-    load_weekly(weekly_data)
-    monthly_data= transform_monthly(final_data)
-    load_monthly(monthly_data)
-    yearly_data=transform_yearly(final_data) 
-    load_yearly(yearly_data)
+    shards = plan_shards()
+    publish_snapshots(record_run(shards, process_shard.expand(shard=shards)))
     
     
 
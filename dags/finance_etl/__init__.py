@@ -0,0 +1 @@
+# Helper modules for the etl_finance_meta DAG. Kept out of DAG parsing via .airflowignore.
@@ -0,0 +1,106 @@
+"""Columnar stage artifacts exchanged between DAG tasks.
+
+Each task writes its output as one Parquet file per symbol under
+<root>/<run_id>/<stage>/ and returns a small manifest; only the manifest goes
+through XCom. The root is a local directory or a pyarrow filesystem URI
+(e.g. s3://bucket/prefix) taken from ETL_ARTIFACT_ROOT.
+"""
+import os
+import re
+import shutil
+
+import pyarrow as pa
+import pyarrow.parquet as pq
+from pyarrow import fs as pafs
+
+from finance_etl.watermarks import rows_after
+
+ARTIFACT_ROOT = os.environ.get('ETL_ARTIFACT_ROOT', '/tmp/etl_finance_artifacts')
+
+
+def _filesystem(root):
+    if '://' in root:
+        return pafs.FileSystem.from_uri(root)
+    return None, os.path.abspath(root)
+
+
+def _run_dir(run_id):
+    return re.sub(r'[^A-Za-z0-9_.-]', '_', run_id)
+
+
+def partition_path(manifest, symbol):
+    return f"{manifest['path']}/symbol={symbol}.parquet"
+
+
+def write_stage(run_id, stage, partitions, root=None):
+    """Write (symbol, DataFrame) pairs as Parquet partitions and return the manifest."""
+    root = root or ARTIFACT_ROOT
+    filesystem, base = _filesystem(root)
+    manifest = {
+        'root': root,
+        'stage': stage,
+        'path': f"{base}/{_run_dir(run_id)}/{stage}",
+        'symbols': [],
+        'columns': [],
+        'rows': 0
+    }
+    if filesystem is None:
+        os.makedirs(manifest['path'], exist_ok=True)
+    else:
+        filesystem.create_dir(manifest['path'], recursive=True)
+    for symbol, frame in partitions:
+        table = pa.Table.from_pandas(frame, preserve_index=False)
+        pq.write_table(table, partition_path(manifest, symbol), filesystem=filesystem)
+        manifest['symbols'].append(symbol)
+        manifest['rows'] += table.num_rows
+        if not manifest['columns']:
+            manifest['columns'] = table.column_names
+    return manifest
+
+
+def read_partition(manifest, symbol, columns=None):
+    filesystem, _ = _filesystem(manifest['root'])
+    path = partition_path(manifest, symbol)
+    if filesystem is None:
+        table = pq.read_table(path, columns=columns, memory_map=True)
+    else:
+        table = pq.read_table(path, columns=columns, filesystem=filesystem)
+    return table.to_pandas()
+
+
+def iter_stage(manifest, symbols=None, columns=None):
+    """Lazily yield (symbol, DataFrame) pairs, reading only the requested columns."""
+    for symbol in manifest['symbols']:
+        if symbols is None or symbol in symbols:
+            yield symbol, read_partition(manifest, symbol, columns)
+
+
+def iter_records(manifest, symbols=None, columns=None, after=None):
+    """Yield the stage's rows as dicts, one partition in memory at a time.
+
+    `after` {symbol: 'YYYY-MM-DD'} leaves out each symbol's rows up to that date.
+    """
+    after = after or {}
+    for symbol, frame in iter_stage(manifest, symbols, columns):
+        yield from rows_after(frame, after.get(symbol)).to_dict('records')
+
+
+def run_file(run_id, name, root=None):
+    """Path (or URI) for a file `name` kept with the artifacts of `run_id`, so remove_run deletes it too."""
+    root = root or ARTIFACT_ROOT
+    if '://' in root:
+        return f"{root.rstrip('/')}/{_run_dir(run_id)}/{name}"
+    directory = os.path.join(os.path.abspath(root), _run_dir(run_id))
+    os.makedirs(directory, exist_ok=True)
+    return os.path.join(directory, name)
+
+
+def remove_run(run_id, root=None):
+    """Delete the artifacts of `run_id`; nothing happens when they are already gone."""
+    root = root or ARTIFACT_ROOT
+    filesystem, base = _filesystem(root)
+    path = f"{base}/{_run_dir(run_id)}"
+    if filesystem is None:
+        shutil.rmtree(path, ignore_errors=True)
+    elif filesystem.get_file_info(path).type != pafs.FileType.NotFound:
+        filesystem.delete_dir(path)
@@ -0,0 +1,39 @@
+"""Symbol universe, sharding and the loaded collections of the DAG.
+
+Nothing here imports pandas or pyarrow: the DAG file reads it on every parse.
+"""
+import os
+
+DEFAULT_SYMBOLS = ['AAPL', 'IBM', 'AMZN', 'MSFT', 'TSLA']
+SYMBOLS_COLLECTION = 'symbols'
+
+# Period name -> pandas period alias. Each period is loaded into stocks_<name>
+# by finance_etl.resample, so adding a granularity only takes a new entry here.
+PERIODS = {
+    'weekly': 'W-SUN',
+    'monthly': 'M',
+    'quarterly': 'Q',
+    'yearly': 'Y',
+}
+INDICATOR_COLLECTION = 'stocks_indicators'
+
+
+def load_symbols(db=None):
+    """Symbols to process, in order of precedence.
+
+    1. ETL_SYMBOLS, a comma separated list in the environment.
+    2. Documents {"_id": symbol, "active": true} in the symbols collection.
+    3. DEFAULT_SYMBOLS.
+    """
+    configured = os.environ.get('ETL_SYMBOLS')
+    if configured:
+        return [symbol.strip() for symbol in configured.split(',') if symbol.strip()]
+    if db is not None:
+        stored = [doc['_id'] for doc in db[SYMBOLS_COLLECTION].find({'active': {'$ne': False}}, {'_id': 1}).sort('_id')]
+        if stored:
+            return stored
+    return list(DEFAULT_SYMBOLS)
+
+
+def shard_symbols(symbols, shard_size):
+    return [symbols[start:start + shard_size] for start in range(0, len(symbols), shard_size)]
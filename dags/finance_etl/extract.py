@@ -0,0 +1,153 @@
+import random
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import pandas as pd
+import requests
+from requests.adapters import HTTPAdapter
+
+from finance_etl import metrics
+
+ALPHA_VANTAGE_URL = 'https://www.alphavantage.co/query'
+DAILY_SERIES_KEY = 'Time Series (Daily)'
+RAW_FIELDS = ['1. open', '2. high', '3. low', '4. close', '5. volume']
+RENAMES = {'1. open': 'open', '2. high': 'high', '3. low': 'low', '4. close': 'close', '5. volume': 'volume'}
+
+
+class TokenBucket:
+    """Thread-safe token bucket refilled at `rate_per_minute` tokens per minute."""
+
+    def __init__(self, rate_per_minute, burst=1):
+        self.rate = rate_per_minute / 60.0
+        self.capacity = max(1, burst)
+        self.tokens = float(self.capacity)
+        self.updated = time.monotonic()
+        self.lock = threading.Lock()
+
+    def acquire(self):
+        while True:
+            with self.lock:
+                now = time.monotonic()
+                self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                wait = (1 - self.tokens) / self.rate
+            time.sleep(wait)
+
+
+class RetryableError(Exception):
+    pass
+
+
+def make_session(pool_size=10):
+    session = requests.Session()
+    adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+    session.mount('http://', adapter)
+    session.mount('https://', adapter)
+    session.hooks['response'].append(lambda response, *args, **kwargs: metrics.observe_http(
+        response.elapsed.total_seconds()))
+    return session
+
+
+def backoff_delay(attempt, base=1.0, cap=60.0):
+    # "Full jitter": sleep a random amount up to the exponential ceiling
+    return random.uniform(0, min(cap, base * 2 ** attempt))
+
+
+def fetch_daily_series(session, symbol, api_key, bucket=None, url=ALPHA_VANTAGE_URL,
+                       outputsize='full', max_retries=4, backoff_base=1.0, timeout=30):
+    params = {
+        'function': 'TIME_SERIES_DAILY',
+        'symbol': symbol,
+        'outputsize': outputsize,
+        'apikey': api_key
+    }
+    for attempt in range(max_retries + 1):
+        if bucket is not None:
+            bucket.acquire()
+        try:
+            response = session.get(url, params=params, timeout=timeout)
+            if response.status_code == 429 or response.status_code >= 500:
+                raise RetryableError(f"HTTP {response.status_code}")
+            if response.status_code != 200:
+                raise ValueError(f"HTTP {response.status_code}")
+            data = response.json()
+            if DAILY_SERIES_KEY in data:
+                return data[DAILY_SERIES_KEY]
+            # Alpha Vantage reports throttling with a 200 and a "Note"/"Information" body
+            if 'Note' in data or 'Information' in data:
+                raise RetryableError(data.get('Note') or data.get('Information'))
+            raise ValueError(data.get('Error Message', 'No daily data in response'))
+        except (RetryableError, requests.ConnectionError, requests.Timeout):
+            if attempt == max_retries:
+                raise
+            time.sleep(backoff_delay(attempt, backoff_base))
+
+
+def after_watermark(series, watermark):
+    """(series, mode) keeping only bars newer than `watermark` when the series reaches back to it."""
+    if watermark is not None and series and min(series) <= watermark:
+        return {date: bar for date, bar in series.items() if date > watermark}, 'incremental'
+    return series, 'full'
+
+
+def fetch_incremental_series(session, symbol, api_key, bucket=None, watermark=None, **kwargs):
+    """Fetch only the bars newer than `watermark`.
+
+    Requests the compact window (latest ~100 bars) and falls back to a full
+    refetch when there is no watermark or the window does not reach back to
+    it, i.e. bars may be missing. Returns (series, mode) where mode is
+    'incremental' if `series` holds only the new bars and 'full' otherwise.
+    """
+    if watermark is not None:
+        series, mode = after_watermark(
+            fetch_daily_series(session, symbol, api_key, bucket, outputsize='compact', **kwargs), watermark)
+        if mode == 'incremental':
+            return series, mode
+        print(f"Gap detected after {watermark} for {symbol}, refetching full history")
+    return fetch_daily_series(session, symbol, api_key, bucket, outputsize='full', **kwargs), 'full'
+
+
+def fetch_all(symbols, api_key, max_workers=4, calls_per_minute=5, burst=1,
+              url=ALPHA_VANTAGE_URL, watermarks=None, max_retries=4, backoff_base=1.0):
+    """Fetch daily series for every symbol concurrently.
+
+    Without `watermarks` every symbol gets its full history. With a
+    {symbol: last loaded date} mapping, see fetch_incremental_series.
+
+    Returns (data, errors, modes): series keyed by symbol for the symbols that
+    succeeded, an error message keyed by symbol for the ones that did not, and
+    the fetch mode ('full' or 'incremental') of each successful symbol.
+    """
+    bucket = TokenBucket(calls_per_minute, burst)
+    session = make_session(max_workers)
+    watermarks = watermarks or {}
+    data, errors, modes = {}, {}, {}
+
+    def fetch(symbol):
+        return fetch_incremental_series(session, symbol, api_key, bucket, watermarks.get(symbol),
+                                        url=url, max_retries=max_retries, backoff_base=backoff_base)
+
+    try:
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            futures = {symbol: executor.submit(fetch, symbol) for symbol in symbols}
+            for symbol, future in futures.items():
+                try:
+                    data[symbol], modes[symbol] = future.result()
+                except Exception as exc:
+                    errors[symbol] = str(exc)
+    finally:
+        session.close()
+    return data, errors, modes
+
+
+def series_to_frame(series):
+    """Turn one Alpha Vantage {date: bar} series into a frame; missing fields become nulls."""
+    bars = series.values()
+    frame = {'Date': list(series.keys())}
+    for field in RAW_FIELDS:
+        frame[field] = [bar.get(field) for bar in bars]
+    return pd.DataFrame(frame)
@@ -0,0 +1,57 @@
+"""Content fingerprints of what was last loaded per symbol, so unchanged symbols skip transform and load.
+
+Each document of etl_fingerprints holds, per kind ('daily' for the normalized
+daily bars, 'metadata' for the scraped company fields), the digest of the
+data last loaded for the symbol.
+"""
+import hashlib
+import json
+
+import pandas as pd
+from pymongo import UpdateOne
+
+from finance_etl.watermarks import rows_after
+
+FINGERPRINT_COLLECTION = 'etl_fingerprints'
+
+
+def frame_fingerprint(frame):
+    """Digest of a frame's column names, dtypes and values (the index is ignored)."""
+    digest = hashlib.blake2b(digest_size=16)
+    digest.update(json.dumps([[column, str(dtype)] for column, dtype in frame.dtypes.items()]).encode('utf-8'))
+    digest.update(pd.util.hash_pandas_object(frame, index=False).to_numpy().tobytes())
+    return digest.hexdigest()
+
+
+def fields_fingerprint(fields):
+    return hashlib.blake2b(json.dumps(fields, sort_keys=True, default=str).encode('utf-8'),
+                           digest_size=16).hexdigest()
+
+
+def get_fingerprints(db, symbols, kind='daily'):
+    cursor = db[FINGERPRINT_COLLECTION].find({'_id': {'$in': list(symbols)}, kind: {'$exists': True}},
+                                             {kind: 1})
+    return {doc['_id']: doc[kind] for doc in cursor}
+
+
+def set_fingerprints(db, fingerprints, kind='daily'):
+    operations = [UpdateOne({'_id': symbol}, {'$set': {kind: fingerprint}}, upsert=True)
+                  for symbol, fingerprint in fingerprints.items()]
+    if operations:
+        db[FINGERPRINT_COLLECTION].bulk_write(operations, ordered=False)
+
+
+def changed_partitions(partitions, stored, fingerprints, watermarks=None):
+    """Yield the (symbol, frame) pairs with new rows whose fingerprint differs from `stored` {symbol: fingerprint}.
+
+    Only the rows after the symbol's watermark in {symbol: date} are new and
+    fingerprinted; earlier rows are context read back from Mongo and are
+    yielded along with them. The fingerprint of every partition, changed or
+    not, is put in `fingerprints`.
+    """
+    watermarks = watermarks or {}
+    for symbol, frame in partitions:
+        new = rows_after(frame, watermarks.get(symbol))
+        fingerprints[symbol] = frame_fingerprint(new)
+        if not new.empty and fingerprints[symbol] != stored.get(symbol):
+            yield symbol, frame
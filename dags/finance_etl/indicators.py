@@ -0,0 +1,116 @@
+"""Technical indicators computed with vectorized rolling-window kernels.
+
+Indicators are computed per symbol over the daily bars and stored in
+stocks_indicators. A run only computes the rows after the symbol's last stored
+indicator row: rolling windows are fed the preceding bars as context, and the
+recursive indicators (EMA, drawdown) are seeded from that stored row.
+"""
+import numpy as np
+import pandas as pd
+
+from finance_etl.config import INDICATOR_COLLECTION
+from finance_etl.load import latest_by_symbol
+
+TRADING_DAYS = 252
+
+
+def sma(bars, window, seed=None):
+    return bars['Close'].rolling(window).mean()
+
+
+def ema(bars, span, seed=None):
+    if seed is None:
+        return bars['Close'].ewm(span=span, adjust=False).mean()
+    # Putting the previous EMA in front continues the recursion exactly where it stopped
+    seeded = pd.concat([pd.Series([seed]), bars['Close']], ignore_index=True)
+    return pd.Series(seeded.ewm(span=span, adjust=False).mean().to_numpy()[1:], index=bars.index)
+
+
+def log_return(bars, seed=None):
+    return np.log(bars['Close']).diff()
+
+
+def volatility(bars, window, seed=None):
+    return np.log(bars['Close']).diff().rolling(window).std() * np.sqrt(TRADING_DAYS)
+
+
+def drawdown(bars, seed=None):
+    peak = bars['Close'].cummax()
+    if seed is not None:
+        peak = np.maximum(peak, seed)
+    return bars['Close'] / peak - 1
+
+
+def vwap(bars, window, seed=None):
+    typical = (bars['High'] + bars['Low'] + bars['Close']) / 3
+    return (typical * bars['Volume']).rolling(window).sum() / bars['Volume'].rolling(window).sum()
+
+
+KERNELS = {'sma': sma, 'ema': ema, 'log_return': log_return, 'volatility': volatility,
+           'drawdown': drawdown, 'vwap': vwap}
+
+# Output field -> (kernel, parameters). Add entries here to store more indicators.
+INDICATORS = {
+    'SMA_20': ('sma', {'window': 20}),
+    'SMA_50': ('sma', {'window': 50}),
+    'EMA_12': ('ema', {'span': 12}),
+    'EMA_26': ('ema', {'span': 26}),
+    'Log_Return': ('log_return', {}),
+    'Volatility_20': ('volatility', {'window': 20}),
+    'Drawdown': ('drawdown', {}),
+    'VWAP_20': ('vwap', {'window': 20}),
+}
+
+
+def lookback(indicators=INDICATORS):
+    # Bars of context a window needs before the first new bar (+1 for differences)
+    return max([params.get('window', 1) for _, params in indicators.values()] + [1]) + 1
+
+
+def _seed(kernel, name, state, last_close):
+    if state is None or state.get(name) is None:
+        return None
+    if kernel == 'ema':
+        return state[name]
+    if kernel == 'drawdown':
+        # Running peak recovered from the stored drawdown of the last stored bar
+        return last_close / (1 + state[name])
+    return None
+
+
+def compute_indicators(symbol, bars, state=None, indicators=INDICATORS):
+    """Indicator rows for the bars of `symbol` after the stored `state` row.
+
+    `bars` has datetime Date and typed Open/High/Low/Close/Volume columns;
+    `state` is the last stored indicator document of the symbol, or None to
+    compute the whole history.
+    """
+    bars = bars.sort_values('Date', ignore_index=True)
+    start = 0
+    last_close = None
+    if state is not None:
+        last_date = pd.Timestamp(state['Date']).to_datetime64()
+        start = int(np.searchsorted(bars['Date'].to_numpy(), last_date, side='right'))
+        if start > 0 and bars['Date'].iat[start - 1] == last_date:
+            last_close = bars['Close'].iat[start - 1]
+        else:
+            # The stored row is not in these bars, so nothing can be seeded from it
+            state, start = None, 0
+    if start >= len(bars):
+        return pd.DataFrame(columns=['Date', 'Symbol'] + list(indicators))
+
+    context = bars.iloc[max(0, start - lookback(indicators)):]
+    new_bars = bars.iloc[start:]
+    result = pd.DataFrame({'Date': new_bars['Date'].to_numpy(), 'Symbol': symbol})
+    for name, (kernel, params) in indicators.items():
+        seed = _seed(kernel, name, state, last_close)
+        # Recursive kernels continue from their seed; windowed ones read the context bars
+        source = new_bars if seed is not None else context
+        values = KERNELS[kernel](source, seed=seed, **params)
+        result[name] = values.loc[new_bars.index].to_numpy()
+    return result
+
+
+def last_indicator_rows(db, symbols):
+    """The newest stored indicator document of each symbol."""
+    return latest_by_symbol(db, INDICATOR_COLLECTION, symbols)
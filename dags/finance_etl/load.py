@@ -0,0 +1,248 @@
+"""Idempotent Mongo loaders for the stocks_* collections."""
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from itertools import islice
+
+from bson import ObjectId
+from pymongo import ASCENDING, DeleteMany, InsertOne, UpdateOne
+from pymongo.errors import CollectionInvalid
+
+from finance_etl import metrics
+
+KEY_FIELDS = ('Symbol', 'Date')
+# Bumped after every run so readers can tell their cached query results are stale
+STATE_COLLECTION = 'etl_state'
+LOAD_GENERATION_ID = 'load_generation'
+# Symbol is the metaField so each symbol's bars are bucketed and compressed together
+TIMESERIES_OPTIONS = {'timeField': 'Date', 'metaField': 'Symbol', 'granularity': 'hours'}
+
+
+def ensure_indexes(collection):
+    collection.create_index([(field, ASCENDING) for field in KEY_FIELDS], unique=True, name='symbol_date')
+
+
+def is_timeseries(db, name):
+    info = next(iter(db.list_collections(filter={'name': name})), None)
+    return bool(info and info.get('type') == 'timeseries')
+
+
+def ensure_collection(db, name, timeseries=False):
+    """Create `name` if missing, as a time-series collection when asked, with its (Symbol, Date) index.
+
+    Time-series collections cannot have unique indexes, so theirs is a plain
+    compound index. An existing regular collection is left as it is; a full
+    refresh publishes it as time-series. Collection types are only looked up
+    when `timeseries` is set, so regular collections also work where
+    list_collections does not (e.g. mongomock).
+    """
+    if timeseries and name not in db.list_collection_names():
+        try:
+            db.create_collection(name, timeseries=TIMESERIES_OPTIONS)
+        except CollectionInvalid:
+            # Another shard created it first
+            pass
+    if timeseries and is_timeseries(db, name):
+        db[name].create_index([(field, ASCENDING) for field in KEY_FIELDS], name='symbol_date')
+    else:
+        ensure_indexes(db[name])
+
+
+def batched(iterable, batch_size):
+    iterator = iter(iterable)
+    while True:
+        batch = list(islice(iterator, batch_size))
+        if not batch:
+            return
+        yield batch
+
+
+def _submit_batches(write, batches, max_workers):
+    """Yield write(batch) for every batch, in order.
+
+    At most 2 * max_workers batches are submitted and not yet written, so
+    batches are built from the records as the writes catch up instead of all
+    up front.
+    """
+    if max_workers <= 1:
+        for batch in batches:
+            yield write(batch)
+        return
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        pending = deque()
+        for batch in batches:
+            if len(pending) >= 2 * max_workers:
+                yield pending.popleft().result()
+            pending.append(executor.submit(write, batch))
+        while pending:
+            yield pending.popleft().result()
+
+
+def upsert_records(collection, records, batch_size=1000, max_workers=4):
+    """Upsert `records` keyed on (Symbol, Date) with unordered bulk writes.
+
+    Unchanged documents match without being modified, so a rerun over the
+    same data writes nothing. Returns the matched/modified/upserted counts.
+    """
+    ensure_indexes(collection)
+    operations = (
+        UpdateOne({field: record[field] for field in KEY_FIELDS}, {'$set': record}, upsert=True)
+        for record in records
+    )
+
+    def write(batch):
+        return collection.bulk_write(batch, ordered=False)
+
+    counts = {'matched': 0, 'modified': 0, 'upserted': 0}
+    for result in _submit_batches(write, batched(operations, batch_size), max_workers):
+        counts['matched'] += result.matched_count
+        counts['modified'] += result.modified_count
+        counts['upserted'] += result.upserted_count
+    return counts
+
+
+def replace_timeseries_records(collection, records, batch_size=1000, max_workers=4):
+    """Write `records` into a time-series collection, replacing stored bars with the same (Symbol, Date).
+
+    Time-series collections do not support upserts. Each batch inserts its
+    documents first and then deletes the older ones with the same keys, so
+    a reader may briefly see a key twice but never finds it missing.
+    Incremental loads only carry new bars and rewritten open periods, so
+    little is ever replaced.
+    """
+    def operations(batch):
+        keys = {}
+        for record in batch:
+            # Ids are assigned up front so the deletes can spare the documents just inserted
+            record.setdefault('_id', ObjectId())
+            dates, ids = keys.setdefault(record['Symbol'], ([], []))
+            dates.append(record['Date'])
+            ids.append(record['_id'])
+        deletes = [DeleteMany({'Symbol': symbol, 'Date': {'$in': dates}, '_id': {'$nin': ids}})
+                   for symbol, (dates, ids) in keys.items()]
+        return [InsertOne(record) for record in batch] + deletes
+
+    def write(batch):
+        return collection.bulk_write(operations(batch), ordered=True)
+
+    counts = {'replaced': 0, 'inserted': 0}
+    for result in _submit_batches(write, batched(records, batch_size), max_workers):
+        counts['replaced'] += result.deleted_count
+        counts['inserted'] += result.inserted_count
+    return counts
+
+
+def latest_by_symbol(db, name, symbols):
+    """The newest stored document of `name` for each symbol that has one."""
+    latest = {}
+    for symbol in symbols:
+        doc = db[name].find_one({'Symbol': symbol}, {'_id': 0}, sort=[('Date', -1)])
+        if doc:
+            latest[symbol] = doc
+    return latest
+
+
+def stored_symbols(db, name, symbols):
+    """The symbols among `symbols` that have at least one document in `name`."""
+    return set(db[name].distinct('Symbol', {'Symbol': {'$in': list(symbols)}}))
+
+
+def staging_name(name):
+    return f'{name}__staging'
+
+
+def drop_staging(db, name):
+    db[staging_name(name)].drop()
+
+
+def stage_records(db, name, records, batch_size=1000, max_workers=4, timeseries=False):
+    """Write `records` into the staging collection of `name`; several loaders may stage in turn.
+
+    Staged documents are keyed on (Symbol, Date) like the live ones, so a
+    retried loader rewrites what it staged before instead of failing on the
+    unique index or, in a time-series collection, duplicating it.
+    """
+    staging = db[staging_name(name)]
+    ensure_collection(db, staging.name, timeseries)
+    if timeseries:
+        counts = replace_timeseries_records(staging, records, batch_size, max_workers)
+        return {'staged': counts['inserted']}
+    counts = upsert_records(staging, records, batch_size, max_workers)
+    return {'staged': counts['matched'] + counts['upserted']}
+
+
+def publish_staging(db, name, timeseries=False):
+    """Replace `name` with its staging collection, so readers see either the old or the new data.
+
+    A regular staging collection is renamed over `name` in one step.
+    Time-series collections cannot be renamed, so with `timeseries` a
+    time-series staging collection is written over `name` with $out. $out
+    can only replace a time-series target, so a regular `name` (the first
+    rebuild after switching to time-series) is moved aside first and `name`
+    is missing until $out finishes.
+    """
+    staging = staging_name(name)
+    if staging not in db.list_collection_names():
+        return False
+    if timeseries and is_timeseries(db, staging):
+        aside = f'{name}__previous'
+        if name in db.list_collection_names() and not is_timeseries(db, name):
+            db[name].rename(aside, dropTarget=True)
+        db[staging].aggregate([{'$out': {'db': db.name, 'coll': name, 'timeseries': TIMESERIES_OPTIONS}}])
+        db[staging].drop()
+        db[aside].drop()
+        ensure_collection(db, name, timeseries)
+    else:
+        db[staging].rename(name, dropTarget=True)
+    return True
+
+
+def load_records(db, name, records, full_refresh=False, batch_size=1000, max_workers=4, timeseries=False):
+    """Upsert `records` into `name`, or stage them when rebuilding.
+
+    Staged records only become visible once publish_staging(db, name) runs.
+    With `timeseries`, rebuilt collections are time-series collections and
+    existing time-series collections are written with
+    replace_timeseries_records.
+    """
+    start = time.perf_counter()
+    if full_refresh:
+        counts = stage_records(db, name, records, batch_size, max_workers, timeseries)
+        documents = counts['staged']
+    elif timeseries and is_timeseries(db, name):
+        counts = replace_timeseries_records(db[name], records, batch_size, max_workers)
+        documents = counts['inserted']
+    else:
+        counts = upsert_records(db[name], records, batch_size, max_workers)
+        documents = counts['matched'] + counts['upserted']
+    # Seconds include producing the records, i.e. reading the stage artifacts
+    metrics.add('mongo_write_seconds', time.perf_counter() - start)
+    metrics.add('mongo_documents', documents)
+    print(f"Loaded {name}: {counts}")
+    return counts
+
+
+def migrate_dates(db, name):
+    """Convert string dates of `name` to BSON dates; period labels "<start> to <end>" become Date and PeriodEnd."""
+    def parse(start):
+        return {'$dateFromString': {'dateString': {'$substrBytes': ['$Date', start, 10]}, 'format': '%Y-%m-%d'}}
+
+    labels = db[name].update_many(
+        {'Date': {'$type': 'string', '$regex': ' to '}},
+        [{'$set': {'Date': parse(0), 'PeriodEnd': parse(14)}}]
+    )
+    days = db[name].update_many({'Date': {'$type': 'string'}}, [{'$set': {'Date': parse(0)}}])
+    return {'periods': labels.modified_count, 'days': days.modified_count}
+
+
+def bump_load_generation(db, run_id):
+    db[STATE_COLLECTION].update_one(
+        {'_id': LOAD_GENERATION_ID},
+        {'$inc': {'generation': 1}, '$set': {'run_id': run_id}},
+        upsert=True
+    )
+
+
+def current_load_generation(db):
+    doc = db[STATE_COLLECTION].find_one({'_id': LOAD_GENERATION_ID}, {'generation': 1})
+    return doc['generation'] if doc else 0
@@ -0,0 +1,41 @@
+"""Company metadata stored once per symbol and joined onto price rows on read."""
+from pymongo import UpdateOne
+
+METADATA_COLLECTION = 'company_metadata'
+METADATA_FIELDS = [
+    'Company Name', 'Market Cap', 'Beta (5Y Monthly)', 'PE Ratio (TTM)', 'EPS (TTM)',
+    'Earnings Date', 'Forward Dividend & Yield', 'Ex-Dividend Date', '1y Target Est'
+]
+
+
+def save_company_metadata(db, meta):
+    """Upsert {symbol: {field: value}} into company_metadata, skipping failed scrapes."""
+    operations = [
+        UpdateOne({'_id': symbol}, {'$set': fields}, upsert=True)
+        for symbol, fields in meta.items() if fields
+    ]
+    if operations:
+        db[METADATA_COLLECTION].bulk_write(operations, ordered=False)
+    return len(operations)
+
+
+def find_company_metadata(db, symbols=None):
+    query = {} if symbols is None else {'_id': {'$in': list(symbols)}}
+    return {doc.pop('_id'): doc for doc in db[METADATA_COLLECTION].find(query)}
+
+
+def migrate_collection(db, name):
+    """Move metadata fields out of every document of `name` into company_metadata."""
+    first = {field: {'$first': f'${field}'} for field in METADATA_FIELDS}
+    pipeline = [
+        {'$match': {METADATA_FIELDS[0]: {'$exists': True}}},
+        {'$group': {'_id': '$Symbol', **first}}
+    ]
+    meta = {doc.pop('_id'): {k: v for k, v in doc.items() if v is not None}
+            for doc in db[name].aggregate(pipeline, allowDiskUse=True)}
+    saved = save_company_metadata(db, meta)
+    result = db[name].update_many(
+        {METADATA_FIELDS[0]: {'$exists': True}},
+        {'$unset': {field: '' for field in METADATA_FIELDS}}
+    )
+    return {'symbols': saved, 'slimmed': result.modified_count}
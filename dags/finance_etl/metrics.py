@@ -0,0 +1,178 @@
+"""Per-task telemetry: timings, record counts, XCom size, memory, HTTP latency and Mongo throughput.
+
+Wrap a task body with instrumented(sink) underneath @task. While it runs,
+observe_http() and add() calls from the helper modules are collected into the
+task's record, which is handed to the sink when the task finishes or fails.
+"""
+import functools
+import json
+import os
+import resource
+import sys
+import threading
+import time
+from datetime import datetime, timezone
+
+METRICS_COLLECTION = 'etl_task_metrics'
+# Upper bounds in seconds; the last bucket catches everything slower
+HTTP_BUCKETS = (0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, float('inf'))
+
+_lock = threading.Lock()
+_current = None
+
+
+def _new_record():
+    return {'counters': {}, 'http': {'count': 0, 'sum': 0.0, 'buckets': [0] * len(HTTP_BUCKETS)}}
+
+
+def add(name, value):
+    """Add `value` to counter `name` of the running task; a no-op outside instrumented tasks."""
+    with _lock:
+        if _current is not None:
+            _current['counters'][name] = _current['counters'].get(name, 0) + value
+
+
+def observe_http(seconds):
+    with _lock:
+        if _current is None:
+            return
+        http = _current['http']
+        http['count'] += 1
+        http['sum'] += seconds
+        http['buckets'][next(i for i, bound in enumerate(HTTP_BUCKETS) if seconds <= bound)] += 1
+
+
+def record_count(value):
+    """Rows in a stage manifest, a dict of manifests or a list; None for anything else."""
+    if isinstance(value, dict):
+        if 'rows' in value and 'symbols' in value:
+            return value['rows']
+        counts = [record_count(item) for item in value.values()]
+        counts = [count for count in counts if count is not None]
+        return sum(counts) if counts else None
+    if isinstance(value, (list, tuple)):
+        return len(value)
+    return None
+
+
+def xcom_bytes(value):
+    if value is None:
+        return 0
+    return len(json.dumps(value, default=str).encode('utf-8'))
+
+
+def peak_rss_mb():
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss is in kilobytes on Linux and bytes on macOS
+    return peak / 2 ** 20 if sys.platform == 'darwin' else peak / 2 ** 10
+
+
+def _task_identity():
+    try:
+        from airflow.operators.python import get_current_context
+        ti = get_current_context()['ti']
+        return {'dag_id': ti.dag_id, 'task_id': ti.task_id, 'run_id': ti.run_id, 'map_index': ti.map_index}
+    except Exception:
+        return {'dag_id': None, 'task_id': None, 'run_id': None, 'map_index': -1}
+
+
+def instrumented(sink):
+    """Decorator recording metrics of each call and passing them to `sink(record)`."""
+    def decorate(function):
+        @functools.wraps(function)
+        def wrapper(*args, **kwargs):
+            global _current
+            record = {**_task_identity(), 'function': function.__name__, **_new_record()}
+            if record['task_id'] is None:
+                record['task_id'] = function.__name__
+            inputs = [record_count(value) for value in list(args) + list(kwargs.values())]
+            inputs = [count for count in inputs if count is not None]
+            record['records_in'] = sum(inputs) if inputs else None
+            with _lock:
+                _current = record
+            start_cpu = time.process_time()
+            start = time.perf_counter()
+            state = 'failed'
+            try:
+                result = function(*args, **kwargs)
+                state = 'success'
+                record['records_out'] = record_count(result)
+                record['xcom_bytes'] = xcom_bytes(result)
+                return result
+            finally:
+                with _lock:
+                    _current = None
+                record.update({
+                    'state': state,
+                    'finished_at': datetime.now(timezone.utc),
+                    'wall_seconds': time.perf_counter() - start,
+                    'cpu_seconds': time.process_time() - start_cpu,
+                    'peak_rss_mb': peak_rss_mb(),
+                })
+                try:
+                    sink(record)
+                except Exception as exc:
+                    # Telemetry must never fail the task it measures
+                    print(f"Could not write task metrics: {exc}")
+        return wrapper
+    return decorate
+
+
+def mongo_sink(get_db, collection=METRICS_COLLECTION):
+    """`get_db` returns the database when a record is written, so no client exists before a task runs."""
+    def write(record):
+        get_db()[collection].insert_one(dict(record))
+    return write
+
+
+def _labels(record):
+    return (f'dag="{record["dag_id"]}",task="{record["task_id"]}",'
+            f'map_index="{record["map_index"]}",state="{record["state"]}"')
+
+
+def prometheus_text(record):
+    """Render one task record in the Prometheus text exposition format."""
+    labels = _labels(record)
+    lines = []
+    gauges = {
+        'wall_seconds': record['wall_seconds'],
+        'cpu_seconds': record['cpu_seconds'],
+        'peak_rss_megabytes': record['peak_rss_mb'],
+        'records_in': record.get('records_in'),
+        'records_out': record.get('records_out'),
+        'xcom_bytes': record.get('xcom_bytes'),
+        'finished_timestamp_seconds': record['finished_at'].timestamp(),
+        **record['counters'],
+    }
+    for name, value in gauges.items():
+        if value is not None:
+            lines.append(f"# TYPE etl_task_{name} gauge")
+            lines.append(f"etl_task_{name}{{{labels}}} {value}")
+    http = record['http']
+    lines.append("# TYPE etl_task_http_request_seconds histogram")
+    cumulative = 0
+    for bound, count in zip(HTTP_BUCKETS, http['buckets']):
+        cumulative += count
+        le = '+Inf' if bound == float('inf') else bound
+        lines.append(f'etl_task_http_request_seconds_bucket{{{labels},le="{le}"}} {cumulative}')
+    lines.append(f"etl_task_http_request_seconds_sum{{{labels}}} {http['sum']}")
+    lines.append(f"etl_task_http_request_seconds_count{{{labels}}} {http['count']}")
+    return '\n'.join(lines) + '\n'
+
+
+def textfile_sink(directory):
+    """One .prom file per task (and map index) for the node_exporter textfile collector."""
+    def write(record):
+        os.makedirs(directory, exist_ok=True)
+        path = os.path.join(directory, f"etl_{record['task_id']}_{record['map_index']}.prom")
+        with open(path + '.tmp', 'w') as f:
+            f.write(prometheus_text(record))
+        # The collector must never read a half-written file
+        os.replace(path + '.tmp', path)
+    return write
+
+
+def sink_from_env(get_db):
+    """ETL_METRICS_TEXTFILE_DIR selects the Prometheus textfile sink, otherwise metrics go to Mongo."""
+    directory = os.environ.get('ETL_METRICS_TEXTFILE_DIR')
+    return textfile_sink(directory) if directory else mongo_sink(get_db)
@@ -0,0 +1,56 @@
+"""One lazily created, pooled MongoClient per process, configured from the environment.
+
+Nothing connects (or even resolves a mongodb+srv host) until get_database()
+is first called, so importing the DAG file or the dashboard touches no network.
+
+    ETL_MONGO_URI                connection string
+    ETL_MONGO_DATABASE           database name (default finance_metadata)
+    ETL_MONGO_MAX_POOL_SIZE      connections per server (default 20)
+    ETL_MONGO_MIN_POOL_SIZE      idle connections kept open (default 0)
+    ETL_MONGO_TIMEOUT_MS         server selection and connect timeouts (default 10000)
+    ETL_MONGO_SOCKET_TIMEOUT_MS  timeout of each operation's reply (default none, as in PyMongo):
+                                 loads and the $out of a rebuild can legitimately run for minutes
+    ETL_MONGO_WRITE_CONCERN      w option, e.g. 1 or majority (default majority)
+"""
+import os
+import threading
+
+from pymongo import MongoClient
+
+DEFAULT_URI = "mongodb+srv://<username>:<password>@<clustername>.mongodb.net/<database-name>?retryWrites=true&w=majority"
+DEFAULT_DATABASE = 'finance_metadata'
+
+_lock = threading.Lock()
+_client = None
+_client_pid = None
+
+
+def client_options(environ=None):
+    environ = os.environ if environ is None else environ
+    timeout = int(environ.get('ETL_MONGO_TIMEOUT_MS', 10000))
+    socket_timeout = environ.get('ETL_MONGO_SOCKET_TIMEOUT_MS')
+    write_concern = environ.get('ETL_MONGO_WRITE_CONCERN', 'majority')
+    return {
+        'maxPoolSize': int(environ.get('ETL_MONGO_MAX_POOL_SIZE', 20)),
+        'minPoolSize': int(environ.get('ETL_MONGO_MIN_POOL_SIZE', 0)),
+        'serverSelectionTimeoutMS': timeout,
+        'connectTimeoutMS': timeout,
+        'socketTimeoutMS': int(socket_timeout) if socket_timeout else None,
+        'w': int(write_concern) if write_concern.isdigit() else write_concern,
+    }
+
+
+def get_client():
+    """The process-wide client, created on first use and again after a fork."""
+    global _client, _client_pid
+    with _lock:
+        # PyMongo clients must not be shared across fork(), e.g. Airflow task runners
+        if _client is None or _client_pid != os.getpid():
+            _client = MongoClient(os.environ.get('ETL_MONGO_URI', DEFAULT_URI), **client_options())
+            _client_pid = os.getpid()
+        return _client
+
+
+def get_database(name=None):
+    return get_client().get_database(name or os.environ.get('ETL_MONGO_DATABASE', DEFAULT_DATABASE))
+
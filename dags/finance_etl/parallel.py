@@ -0,0 +1,81 @@
+"""Run per-symbol transform steps over stage artifacts, optionally in several worker processes.
+
+A step maps (symbol, frame) pairs to (symbol, frame) pairs, or to {stage:
+pairs} when it produces several stages (see finance_etl.transforms).
+run_step feeds it the partitions of a stage manifest and writes what it
+yields as new stages. With more than one worker the manifest's symbols are
+split into contiguous slices. Each worker process memory-maps the Parquet
+partitions of its slice, runs the step and writes its own output partitions,
+so no frame is ever pickled between processes; the parent only merges the
+small per-slice manifests.
+"""
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+
+from finance_etl.artifacts import iter_stage, write_stage
+
+
+def _write(run_key, stage, output, root):
+    if isinstance(output, dict):
+        return {name: write_stage(run_key, name, pairs, root=root) for name, pairs in output.items()}
+    return write_stage(run_key, stage, output, root=root)
+
+
+def _run_slice(step, manifest, symbols, columns, run_key, stage, report, options):
+    partitions = iter_stage(manifest, symbols=None if symbols is None else set(symbols), columns=columns)
+    if report:
+        report = {}
+        output = step(partitions, report=report, **options)
+    else:
+        output = step(partitions, **options)
+    return _write(run_key, stage, output, manifest['root']), report
+
+
+def merge_manifests(parts):
+    """One manifest of a stage from the manifests its slices were written with; the files stay where they are."""
+    merged = dict(parts[0], symbols=[], columns=[], rows=0)
+    for part in parts:
+        merged['symbols'] += part['symbols']
+        merged['rows'] += part['rows']
+        merged['columns'] = merged['columns'] or part['columns']
+    return merged
+
+
+def _merge(results):
+    outputs = [output for output, _ in results]
+    if isinstance(outputs[0], dict) and 'symbols' not in outputs[0]:
+        output = {name: merge_manifests([part[name] for part in outputs]) for name in outputs[0]}
+    else:
+        output = merge_manifests(outputs)
+    report = {}
+    for _, part in results:
+        for name, values in (part or {}).items():
+            report.setdefault(name, {}).update(values)
+    return output, report
+
+
+def run_step(step, manifest, run_key, stage=None, columns=None, workers=1, report=False, **options):
+    """Run `step` over the partitions of `manifest` and write its output under `run_key`.
+
+    Returns (manifest, report), the manifest being {stage: manifest} when the
+    step returns {stage: pairs}. With report=True the step is also called
+    with a `report` dict in which it records per-symbol side results as
+    report[name][symbol]; they are merged across workers. `options` go to
+    every call of the step and, like the step, must be picklable when
+    `workers` > 1.
+    """
+    symbols = manifest['symbols']
+    count = min(workers, len(symbols))
+    if count > 1 and multiprocessing.current_process().daemon:
+        # e.g. a Celery prefork worker, whose processes may not have children
+        print("Running transform serially: daemonic processes cannot start workers")
+        count = 1
+    if count <= 1:
+        output, step_report = _run_slice(step, manifest, None, columns, run_key, stage, report, options)
+        return output, step_report or {}
+    slices = [symbols[index * len(symbols) // count:(index + 1) * len(symbols) // count] for index in range(count)]
+    # Spawned rather than forked: the task process holds Mongo and HTTP client threads
+    with ProcessPoolExecutor(max_workers=count, mp_context=multiprocessing.get_context('spawn')) as pool:
+        futures = [pool.submit(_run_slice, step, manifest, part, columns, run_key, stage, report, options)
+                   for part in slices]
+        return _merge([future.result() for future in futures])
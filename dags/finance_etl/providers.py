@@ -0,0 +1,231 @@
+"""Interchangeable sources for daily prices and company metadata.
+
+A price provider has fetch_daily(symbols, watermarks) returning (data, errors,
+modes) like extract.fetch_all: Alpha Vantage shaped {date: bar} series keyed
+by symbol, an error message per failed symbol and 'full' or 'incremental' per
+fetched symbol. A metadata provider has fetch_metadata(symbols) returning
+{symbol: fields or None}.
+
+Providers are picked with a spec string such as 'alphavantage',
+'replay:/path/to/fixtures' or 'bulk:/path/to/dump.parquet' (see
+price_provider and metadata_provider).
+"""
+import json
+import os
+
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.dataset as ds
+import pyarrow.parquet as pq
+
+from finance_etl.extract import RAW_FIELDS, after_watermark, fetch_all
+from finance_etl.scrape import fetch_all_metadata
+
+# Bulk dump column -> Alpha Vantage bar field
+BULK_FIELDS = dict(zip(['open', 'high', 'low', 'close', 'volume'], RAW_FIELDS))
+
+
+class AlphaVantageProvider:
+    def __init__(self, api_key, max_workers=4, calls_per_minute=5, **kwargs):
+        self.api_key = api_key
+        self.max_workers = max_workers
+        self.calls_per_minute = calls_per_minute
+        self.kwargs = kwargs
+
+    def fetch_daily(self, symbols, watermarks=None):
+        return fetch_all(symbols, api_key=self.api_key, max_workers=self.max_workers,
+                         calls_per_minute=self.calls_per_minute, watermarks=watermarks, **self.kwargs)
+
+
+class YahooProvider:
+    def __init__(self, max_workers=4, ttl=6 * 3600, **kwargs):
+        self.max_workers = max_workers
+        self.ttl = ttl
+        self.kwargs = kwargs
+
+    def fetch_metadata(self, symbols):
+        return fetch_all_metadata(symbols, max_workers=self.max_workers, ttl=self.ttl, **self.kwargs)
+
+
+class NoMetadataProvider:
+    def fetch_metadata(self, symbols):
+        return {}
+
+
+def _fixture_path(directory, kind, symbol):
+    return os.path.join(directory, kind, f"{symbol}.json")
+
+
+class ReplayProvider:
+    """Serves fixtures recorded by RecordingProvider from <directory>/{daily,metadata}/<symbol>.json."""
+
+    def __init__(self, directory):
+        self.directory = directory
+
+    def _read(self, kind, symbol):
+        with open(_fixture_path(self.directory, kind, symbol)) as f:
+            return json.load(f)
+
+    def fetch_daily(self, symbols, watermarks=None):
+        watermarks = watermarks or {}
+        data, errors, modes = {}, {}, {}
+        for symbol in symbols:
+            try:
+                series = self._read('daily', symbol)
+            except OSError as exc:
+                errors[symbol] = f"No recorded daily series: {exc}"
+                continue
+            data[symbol], modes[symbol] = after_watermark(series, watermarks.get(symbol))
+        return data, errors, modes
+
+    def fetch_metadata(self, symbols):
+        meta = {}
+        for symbol in symbols:
+            try:
+                meta[symbol] = self._read('metadata', symbol)
+            except OSError:
+                meta[symbol] = None
+        return meta
+
+
+class RecordingProvider:
+    """Passes calls through to `provider` and writes what it returned as replay fixtures.
+
+    Only full series are recorded, so a replayed incremental run still has
+    the history before its watermark.
+    """
+
+    def __init__(self, provider, directory):
+        self.provider = provider
+        self.directory = directory
+
+    def _write(self, kind, symbol, value):
+        path = _fixture_path(self.directory, kind, symbol)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path + '.tmp', 'w') as f:
+            json.dump(value, f)
+        os.replace(path + '.tmp', path)
+
+    def fetch_daily(self, symbols, watermarks=None):
+        data, errors, modes = self.provider.fetch_daily(symbols, watermarks)
+        for symbol, series in data.items():
+            if modes[symbol] == 'full':
+                self._write('daily', symbol, series)
+        return data, errors, modes
+
+    def fetch_metadata(self, symbols):
+        meta = self.provider.fetch_metadata(symbols)
+        for symbol, fields in meta.items():
+            if fields:
+                self._write('metadata', symbol, fields)
+        return meta
+
+
+class BulkFileProvider:
+    """Daily bars for many symbols from CSV or Parquet exchange dumps.
+
+    `path` is a file or a directory of files (or a URI pyarrow understands)
+    with symbol, date, open, high, low, close and volume columns, renamed
+    through `columns` if they differ. Only the requested symbols' rows and
+    the needed columns are read, batch by batch.
+
+    CSV cannot skip rows and unsorted Parquet skips few row groups, so every
+    fetch_daily reads through the whole dump. To serve many shards, split()
+    the dump once and give each shard a provider on its own file.
+    """
+
+    def __init__(self, path, file_format=None, columns=None):
+        self.path = path
+        if file_format is None:
+            file_format = 'csv' if path.endswith(('.csv', '.csv.gz')) else 'parquet'
+        self.file_format = file_format
+        self.columns = {'symbol': 'symbol', 'date': 'date', **{field: field for field in BULK_FIELDS},
+                        **(columns or {})}
+
+    def _scanner(self, symbols):
+        dataset = ds.dataset(self.path, format=self.file_format)
+        return dataset.scanner(columns=list(self.columns.values()),
+                               filter=pc.field(self.columns['symbol']).isin(list(symbols)))
+
+    def split(self, shards, paths):
+        """Write the rows of each shard's symbols to the Parquet file at the same index of `paths`, in one pass.
+
+        The files use the default column names, so BulkFileProvider(path)
+        reads a shard back. Shards without rows get an empty file.
+        """
+        shard_of = {symbol: index for index, shard in enumerate(shards) for symbol in shard}
+        value_set = pa.array(list(shard_of), pa.string())
+        shard_index = pa.array(list(shard_of.values()), pa.int64())
+        scanner = self._scanner(shard_of)
+        schema = pa.schema([field.with_name(name)
+                            for name, field in zip(self.columns, scanner.projected_schema)])
+        writers = {}
+        try:
+            for batch in scanner.to_batches():
+                table = pa.Table.from_batches([batch]).rename_columns(list(self.columns))
+                shard = pc.take(shard_index, pc.index_in(pc.cast(table['symbol'], pa.string()), value_set=value_set))
+                for index in pc.unique(shard).to_pylist():
+                    if index not in writers:
+                        writers[index] = pq.ParquetWriter(paths[index], schema)
+                    writers[index].write_table(table.filter(pc.equal(shard, index)))
+            for index, path in enumerate(paths):
+                if index not in writers:
+                    writers[index] = pq.ParquetWriter(path, schema)
+        finally:
+            for writer in writers.values():
+                writer.close()
+        return paths
+
+    def fetch_daily(self, symbols, watermarks=None):
+        watermarks = watermarks or {}
+        symbol_column = self.columns['symbol']
+        series = {}
+        for batch in self._scanner(symbols).to_batches():
+            rows = batch.to_pydict()
+            dates = [str(value)[:10] for value in rows[self.columns['date']]]
+            fields = {field: rows[self.columns[name]] for name, field in BULK_FIELDS.items()}
+            for index, symbol in enumerate(rows[symbol_column]):
+                series.setdefault(symbol, {})[dates[index]] = {
+                    field: None if values[index] is None else str(values[index]) for field, values in fields.items()
+                }
+        data, errors, modes = {}, {}, {}
+        for symbol in symbols:
+            if symbol not in series:
+                errors[symbol] = f"Not in bulk file {self.path}"
+                continue
+            # Newest first, matching Alpha Vantage
+            ordered = {date: series[symbol][date] for date in sorted(series[symbol], reverse=True)}
+            data[symbol], modes[symbol] = after_watermark(ordered, watermarks.get(symbol))
+        return data, errors, modes
+
+
+def _with_recording(provider, record_dir):
+    return RecordingProvider(provider, record_dir) if record_dir else provider
+
+
+def price_provider(spec, record_dir=None, **alpha_vantage):
+    """'alphavantage' (keyword arguments go to AlphaVantageProvider), 'replay:<dir>' or 'bulk:<path>'."""
+    kind, _, location = spec.partition(':')
+    if kind == 'alphavantage':
+        provider = AlphaVantageProvider(**alpha_vantage)
+    elif kind == 'replay':
+        provider = ReplayProvider(location)
+    elif kind == 'bulk':
+        provider = BulkFileProvider(location)
+    else:
+        raise ValueError(f"Unknown price provider: {spec}")
+    return _with_recording(provider, record_dir)
+
+
+def metadata_provider(spec, record_dir=None, **yahoo):
+    """'yahoo' (keyword arguments go to YahooProvider), 'replay:<dir>' or 'none'."""
+    kind, _, location = spec.partition(':')
+    if kind == 'yahoo':
+        provider = YahooProvider(**yahoo)
+    elif kind == 'replay':
+        provider = ReplayProvider(location)
+    elif kind == 'none':
+        provider = NoMetadataProvider()
+    else:
+        raise ValueError(f"Unknown metadata provider: {spec}")
+    return _with_recording(provider, record_dir)
@@ -0,0 +1,16 @@
+"""Rows rejected by normalization, kept for inspection instead of being dropped."""
+from datetime import datetime, timezone
+
+QUARANTINE_COLLECTION = 'etl_quarantine'
+
+
+def quarantine_rows(db, run_id, symbol, rows):
+    """Store rejected rows (Date, raw fields, Reason) of `symbol`; rerunning a run replaces its rows."""
+    collection = db[QUARANTINE_COLLECTION]
+    collection.delete_many({'run_id': run_id, 'Symbol': symbol})
+    now = datetime.now(timezone.utc)
+    documents = [{'run_id': run_id, 'Symbol': symbol, 'quarantined_at': now, **row}
+                 for row in rows.astype(object).where(rows.notna(), None).to_dict('records')]
+    if documents:
+        collection.insert_many(documents)
+    return len(documents)
@@ -0,0 +1,122 @@
+"""Columnar OHLCV rollups for every registered period in one pass.
+
+Period documents are partial aggregates: besides OHLCV they keep LastDate,
+the newest daily bar folded in. An incremental run therefore only aggregates
+the bars after each symbol's stored open period and merges them into it.
+"""
+import numpy as np
+import pandas as pd
+
+from finance_etl.config import PERIODS
+
+OHLCV = ['open', 'high', 'low', 'close', 'volume']
+OUTPUT_COLUMNS = ['Date', 'PeriodEnd', 'LastDate', 'Symbol', 'Open', 'High', 'Close', 'Low', 'Volume']
+
+# Periods that nest exactly in a finer one are rolled up from its aggregates instead of the daily bars
+SOURCES = {
+    'quarterly': 'monthly',
+    'yearly': 'quarterly',
+}
+
+AGGREGATIONS = {
+    'open': ('open', 'first'),
+    'high': ('high', 'max'),
+    'low': ('low', 'min'),
+    'close': ('close', 'last'),
+    'volume': ('volume', 'sum'),
+    'LastDate': ('LastDate', 'max'),
+}
+
+
+def _typed_part(symbol, dates, columns):
+    part = pd.DataFrame({field: np.asarray(columns[field], dtype=float) for field in OHLCV})
+    part.insert(0, 'Date', pd.to_datetime(np.asarray(dates), format='ISO8601'))
+    part.insert(0, 'Symbol', symbol)
+    return part
+
+
+def _concat(parts):
+    if not parts:
+        return pd.DataFrame({'Symbol': pd.Series(dtype=object), 'Date': pd.Series(dtype='datetime64[ns]'),
+                             **{field: pd.Series(dtype=float) for field in OHLCV}})
+    frame = pd.concat(parts, ignore_index=True)
+    return frame.sort_values(['Symbol', 'Date'], kind='stable', ignore_index=True)
+
+
+def resample_frame(frame, alias):
+    """Aggregate a frame sorted by Symbol, Date into one OHLCV row per symbol and period.
+
+    `frame` holds daily bars or the rows of a finer period (Date is then the
+    start of each finer period), with lowercase OHLCV columns.
+    """
+    if 'LastDate' not in frame:
+        frame = frame.assign(LastDate=frame['Date'])
+    period = frame['Date'].dt.to_period(alias)
+    grouped = frame.groupby([frame['Symbol'], period], sort=True).agg(**AGGREGATIONS)
+    periods = pd.PeriodIndex(grouped.index.get_level_values(1), freq=alias)
+    # Date is the first day of the period and PeriodEnd its last day, both as datetimes
+    grouped.insert(0, 'Date', periods.start_time)
+    grouped.insert(1, 'PeriodEnd', periods.end_time.normalize())
+    return grouped.reset_index(level=0).reset_index(drop=True)
+
+
+def _documents(rollup):
+    return rollup.rename(columns={field: field.capitalize() for field in OHLCV})[OUTPUT_COLUMNS]
+
+
+def rollup_frames(frame, periods=None):
+    """Full rollups {period: lowercase frame}, reusing finer periods where SOURCES allows."""
+    wanted = periods or PERIODS
+    rollups = {}
+    for name in PERIODS:
+        if name in wanted or any(SOURCES.get(other) == name for other in wanted):
+            source = rollups.get(SOURCES.get(name), frame)
+            rollups[name] = resample_frame(source, PERIODS[name])
+    return {name: rollups[name] for name in wanted}
+
+
+def _stored_frame(state):
+    docs = [doc for doc in state.values() if doc.get('LastDate') is not None]
+    frame = pd.DataFrame(docs, columns=['Symbol', 'Date', 'LastDate', 'Open', 'High', 'Low', 'Close', 'Volume'])
+    frame['Date'] = pd.to_datetime(frame['Date'])
+    frame['LastDate'] = pd.to_datetime(frame['LastDate'])
+    for field in OHLCV:
+        frame[field.capitalize()] = frame[field.capitalize()].astype(float)
+    return frame
+
+
+def fold_frame(frame, alias, state):
+    """Aggregate only the bars after each symbol's stored open period and merge them into it.
+
+    `state` maps symbol -> the newest stored document of the period. Symbols
+    without one (or with a document from before LastDate was kept) are
+    aggregated from all their bars in `frame`, so `frame` must hold their
+    whole history. Returns the rewritten open periods and the new periods only.
+    """
+    stored = _stored_frame(state)
+    cutoff = frame[['Symbol']].merge(stored[['Symbol', 'LastDate']], on='Symbol', how='left')['LastDate']
+    new_bars = frame[cutoff.isna().to_numpy() | (frame['Date'] > cutoff).to_numpy()]
+    rollup = resample_frame(new_bars, alias)
+    merged = rollup.merge(stored.drop(columns='LastDate'), on=['Symbol', 'Date'], how='left')
+    open_period = merged['Open'].notna().to_numpy()
+    # The stored open period already holds its first open and the bars up to LastDate
+    rollup['open'] = np.where(open_period, merged['Open'], rollup['open'])
+    rollup['high'] = np.fmax(rollup['high'], merged['High'].to_numpy())
+    rollup['low'] = np.fmin(rollup['low'], merged['Low'].to_numpy())
+    rollup['volume'] += np.where(open_period, merged['Volume'], 0)
+    return rollup
+
+
+def resample_partitions(partitions, periods=None, states=None):
+    """Roll (symbol, typed daily frame) pairs up into {period: frame}.
+
+    Without `states` every period is recomputed. With {period: {symbol: newest
+    stored document}}, see fold_frame: only open and new periods come back.
+    """
+    parts = [_typed_part(symbol, frame['Date'], {field: frame[field.capitalize()] for field in OHLCV})
+             for symbol, frame in partitions if not frame.empty]
+    frame = _concat(parts)
+    if states is None:
+        return {name: _documents(rollup) for name, rollup in rollup_frames(frame, periods).items()}
+    return {name: _documents(fold_frame(frame, PERIODS[name], states.get(name, {})))
+            for name in periods or PERIODS}
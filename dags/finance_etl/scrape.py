@@ -0,0 +1,110 @@
+"""Concurrent Yahoo Finance quote-page scraper with a persistent conditional-GET cache."""
+import hashlib
+import json
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from bs4 import BeautifulSoup, SoupStrainer
+
+from finance_etl.extract import make_session
+
+YAHOO_QUOTE_URL = 'https://finance.yahoo.com/quote/{symbol}/'
+CACHE_DIR = os.environ.get('ETL_METADATA_CACHE', '/tmp/etl_finance_metadata_cache')
+NAME_CLASS = 'D(ib) Fz(18px)'
+SUMMARY_CLASS = 'W(100%) M(0) Bdcl(c)'
+# Only the company name and the summary tables are built into a tree
+SUMMARY_ONLY = SoupStrainer(['h1', 'table'])
+
+
+def parse_quote_page(content):
+    soup = BeautifulSoup(content, 'lxml', parse_only=SUMMARY_ONLY)
+    metadata = {}
+    name = soup.find('h1', class_=NAME_CLASS)
+    if name:
+        metadata['Company Name'] = name.text.strip()
+    for table in soup.find_all('table', class_=SUMMARY_CLASS):
+        for row in table.find_all('tr'):
+            cells = row.find_all('td')
+            if len(cells) == 2:
+                metadata[cells[0].text.strip()] = cells[1].text.strip()
+    return metadata
+
+
+def _cache_path(cache_dir, url):
+    return os.path.join(cache_dir, hashlib.sha1(url.encode()).hexdigest() + '.json')
+
+
+def _read_cache(path):
+    try:
+        with open(path) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+def _write_cache(path, entry):
+    tmp = f"{path}.{os.getpid()}.tmp"
+    with open(tmp, 'w') as f:
+        json.dump(entry, f)
+    os.replace(tmp, path)
+
+
+def fetch_metadata(session, symbol, cache_dir=CACHE_DIR, ttl=6 * 3600, url_template=YAHOO_QUOTE_URL, timeout=30):
+    """Return (metadata, source) where source is 'cache', 'not-modified' or 'fetched'.
+
+    Entries younger than `ttl` seconds are served without a request; older ones
+    are revalidated with If-None-Match / If-Modified-Since.
+    """
+    url = url_template.format(symbol=symbol)
+    path = _cache_path(cache_dir, url)
+    cached = _read_cache(path)
+    if cached and time.time() - cached['fetched_at'] < ttl:
+        return cached['metadata'], 'cache'
+
+    headers = {}
+    if cached:
+        if cached.get('etag'):
+            headers['If-None-Match'] = cached['etag']
+        if cached.get('last_modified'):
+            headers['If-Modified-Since'] = cached['last_modified']
+    response = session.get(url, headers=headers, timeout=timeout)
+    if response.status_code == 304 and cached:
+        cached['fetched_at'] = time.time()
+        _write_cache(path, cached)
+        return cached['metadata'], 'not-modified'
+    response.raise_for_status()
+
+    metadata = parse_quote_page(response.content)
+    _write_cache(path, {
+        'etag': response.headers.get('ETag'),
+        'last_modified': response.headers.get('Last-Modified'),
+        'fetched_at': time.time(),
+        'metadata': metadata
+    })
+    return metadata, 'fetched'
+
+
+def fetch_all_metadata(symbols, max_workers=4, cache_dir=CACHE_DIR, ttl=6 * 3600, url_template=YAHOO_QUOTE_URL):
+    """Scrape every symbol concurrently; failed symbols map to None as before."""
+    os.makedirs(cache_dir, exist_ok=True)
+    session = make_session(max_workers)
+    meta, sources = {}, {}
+
+    def fetch(symbol):
+        return fetch_metadata(session, symbol, cache_dir, ttl, url_template)
+
+    try:
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            futures = {symbol: executor.submit(fetch, symbol) for symbol in symbols}
+            for symbol, future in futures.items():
+                try:
+                    meta[symbol], source = future.result()
+                    sources[source] = sources.get(source, 0) + 1
+                except Exception as exc:
+                    print(f"Failed to retrieve metadata for {symbol}: {exc}")
+                    meta[symbol] = None
+    finally:
+        session.close()
+    print(f"Company metadata sources: {sources}")
+    return meta
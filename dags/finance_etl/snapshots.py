@@ -0,0 +1,190 @@
+"""Read-optimized snapshot files of the stocks_* collections, served to the dashboard from local disk.
+
+A snapshot is a directory under the snapshot root holding one Arrow IPC file
+per dataset and symbol (<dataset>/<symbol>.arrow: Date and the value
+columns) and a manifest.json. <root>/current is a symlink to the newest
+snapshot and is replaced atomically, so a reader sees either the previous or
+the new snapshot, never a mix. Files of symbols a run did not change are hard
+links into the previous snapshot. Mongo stays the system of record.
+"""
+import json
+import os
+import re
+import shutil
+import tempfile
+import threading
+from datetime import datetime, timezone
+
+import pyarrow as pa
+
+from finance_etl.indicators import INDICATOR_COLLECTION, INDICATORS
+from finance_etl.load import current_load_generation
+from finance_etl.resample import PERIODS
+
+CURRENT = 'current'
+MANIFEST = 'manifest.json'
+# Older snapshots are deleted; readers still mapping their files keep them until unmapped
+KEEP_SNAPSHOTS = 3
+BATCH_SIZE = 10000
+SERIES_FIELDS = ['Open', 'High', 'Low', 'Close', 'Volume']
+# Dataset -> (collection, value columns)
+DATASETS = {
+    'daily': ('stocks_daily', SERIES_FIELDS),
+    **{period: (f'stocks_{period}', SERIES_FIELDS) for period in PERIODS},
+    'indicators': (INDICATOR_COLLECTION, list(INDICATORS)),
+}
+
+
+def _file_name(symbol):
+    return re.sub(r'[^A-Za-z0-9_.^=-]', '_', symbol) + '.arrow'
+
+
+def read_manifest(directory):
+    try:
+        with open(os.path.join(directory, MANIFEST)) as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return None
+
+
+def _symbol_series(db, collection, fields, symbols):
+    """Yield (symbol, dates, {field: values}) from one cursor sorted by Symbol, Date."""
+    query = {'Symbol': {'$in': sorted(symbols)}}
+    projection = {'_id': 0, 'Symbol': 1, 'Date': 1, **{field: 1 for field in fields}}
+    cursor = db[collection].find(query, projection).sort([('Symbol', 1), ('Date', 1)]).batch_size(BATCH_SIZE)
+    symbol, dates, values = None, [], {}
+    for doc in cursor:
+        if doc['Symbol'] != symbol:
+            if symbol is not None:
+                yield symbol, dates, values
+            symbol, dates, values = doc['Symbol'], [], {field: [] for field in fields}
+        dates.append(doc['Date'])
+        for field in fields:
+            values[field].append(doc.get(field))
+    if symbol is not None:
+        yield symbol, dates, values
+
+
+def _write_table(path, dates, values):
+    table = pa.table({
+        'Date': pa.array(dates, type=pa.timestamp('ms')),
+        **{field: pa.array(column, type=pa.float64()) for field, column in values.items()},
+    })
+    # Uncompressed IPC files can be memory-mapped and read without copying
+    with pa.OSFile(path, 'wb') as sink, pa.ipc.new_file(sink, table.schema) as writer:
+        writer.write_table(table)
+    return {'rows': table.num_rows, 'last_date': dates[-1].strftime('%Y-%m-%d') if dates else None}
+
+
+def _link(source, target):
+    try:
+        os.link(source, target)
+    except OSError:
+        # e.g. a filesystem without hard links
+        shutil.copyfile(source, target)
+
+
+def _swap_current(root, directory):
+    link = os.path.join(root, CURRENT)
+    temporary = f"{link}.{os.getpid()}.tmp"
+    if os.path.lexists(temporary):
+        os.remove(temporary)
+    os.symlink(os.path.basename(directory), temporary)
+    os.replace(temporary, link)
+
+
+def _remove_old(root, keep=KEEP_SNAPSHOTS):
+    current = os.path.realpath(os.path.join(root, CURRENT))
+    snapshots = sorted((entry.path for entry in os.scandir(root)
+                        if entry.is_dir(follow_symlinks=False) and entry.name.startswith('snapshot-')),
+                       key=os.path.getmtime, reverse=True)
+    for path in snapshots[keep:]:
+        if os.path.realpath(path) != current:
+            shutil.rmtree(path, ignore_errors=True)
+
+
+def publish_snapshot(db, root, run_id, changed=None):
+    """Write a snapshot of every stored symbol, make it current and return its manifest.
+
+    `changed` lists the symbols whose documents this run rewrote; only they
+    (and symbols missing from the current snapshot) are read from Mongo, the
+    rest are linked. None rereads everything, e.g. after a full refresh.
+    """
+    os.makedirs(root, exist_ok=True)
+    previous_dir = os.path.realpath(os.path.join(root, CURRENT))
+    previous = read_manifest(previous_dir)
+    generation = current_load_generation(db)
+    directory = tempfile.mkdtemp(prefix=f"snapshot-{generation}-", dir=root)
+    os.chmod(directory, 0o755)
+    manifest = {'run_id': run_id, 'generation': generation, 'created_at': datetime.now(timezone.utc).isoformat(),
+                'datasets': {}}
+    counts = {'written': 0, 'linked': 0}
+    for dataset, (collection, fields) in DATASETS.items():
+        os.makedirs(os.path.join(directory, dataset))
+        stored = set(db[collection].distinct('Symbol'))
+        held = previous['datasets'].get(dataset, {}) if previous else {}
+        reuse = set() if changed is None else stored.intersection(held).difference(changed)
+        entries = manifest['datasets'][dataset] = {}
+        for symbol in sorted(reuse):
+            _link(os.path.join(previous_dir, dataset, _file_name(symbol)),
+                  os.path.join(directory, dataset, _file_name(symbol)))
+            entries[symbol] = held[symbol]
+            counts['linked'] += 1
+        for symbol, dates, values in _symbol_series(db, collection, fields, stored - reuse):
+            entries[symbol] = _write_table(os.path.join(directory, dataset, _file_name(symbol)), dates, values)
+            counts['written'] += 1
+    with open(os.path.join(directory, MANIFEST), 'w') as f:
+        json.dump(manifest, f)
+    _swap_current(root, directory)
+    _remove_old(root)
+    print(f"Published snapshot {os.path.basename(directory)}: {counts}")
+    return {'directory': directory, 'generation': generation, **counts}
+
+
+class SnapshotStore:
+    """Memory-mapped reads from the current snapshot under `root`.
+
+    refresh() follows the current symlink to a newly published snapshot; reads
+    in between keep using the one already resolved, so a swap never mixes
+    files of two snapshots.
+    """
+
+    def __init__(self, root):
+        self.root = root
+        self.lock = threading.Lock()
+        self.snapshot = (None, None)
+
+    def refresh(self):
+        """Switch to the snapshot `current` points at and return its generation (None without one)."""
+        with self.lock:
+            try:
+                directory = os.path.join(self.root, os.readlink(os.path.join(self.root, CURRENT)))
+            except OSError:
+                self.snapshot = (None, None)
+                return None
+            if directory != self.snapshot[0]:
+                manifest = read_manifest(directory)
+                self.snapshot = (directory, manifest) if manifest else (None, None)
+            manifest = self.snapshot[1]
+            return manifest['generation'] if manifest else None
+
+    def symbols(self, dataset):
+        """Sorted symbols of `dataset`, or None when no snapshot holds it."""
+        _, manifest = self.snapshot
+        if not manifest or dataset not in manifest['datasets']:
+            return None
+        return sorted(manifest['datasets'][dataset])
+
+    def read(self, dataset, symbol, columns=None):
+        """The symbol's frame from the current snapshot, or None when the snapshot does not have it."""
+        directory, manifest = self.snapshot
+        if not manifest or symbol not in manifest['datasets'].get(dataset, {}):
+            return None
+        # The table's buffers point into the mapping, which stays open as long as they are referenced
+        source = pa.memory_map(os.path.join(directory, dataset, _file_name(symbol)))
+        table = pa.ipc.open_file(source).read_all()
+        if columns is not None:
+            table = table.select(columns)
+        frame = table.to_pandas(split_blocks=True)
+        frame['Date'] = frame['Date'].astype('datetime64[ns]')
+        return frame
@@ -0,0 +1,92 @@
+"""Per-symbol transform steps of the DAG, usable without Airflow.
+
+Each step takes and yields (symbol, DataFrame) pairs, which is what
+artifacts.iter_stage reads and artifacts.write_stage writes, so a DAG task is
+just `write_stage(key, stage, step(iter_stage(manifest)))`.
+"""
+import numpy as np
+import pandas as pd
+
+from finance_etl.extract import RAW_FIELDS, RENAMES, series_to_frame
+from finance_etl.fingerprints import changed_partitions
+from finance_etl.indicators import compute_indicators
+from finance_etl.resample import resample_partitions
+
+DAILY_FIELDS = ['Open', 'High', 'Low', 'Close', 'Volume']
+DAILY_COLUMNS = ['Date', 'Symbol'] + DAILY_FIELDS
+
+
+def raw_partitions(data):
+    """Alpha Vantage {symbol: {date: bar}} payloads as raw string frames."""
+    for symbol, series in data.items():
+        yield symbol, series_to_frame(series)
+
+
+def _rejection_reasons(raw, dates, values):
+    """Why each raw row is rejected, '' for rows that pass."""
+    missing = raw[RAW_FIELDS].isna().any(axis=1)
+    not_numeric = pd.concat([values[field].isna() for field in DAILY_FIELDS], axis=1).any(axis=1) & ~missing
+    negative = pd.concat([values[field] < 0 for field in DAILY_FIELDS], axis=1).any(axis=1)
+    conditions = [
+        dates.isna(),
+        missing,
+        not_numeric,
+        negative,
+        values['High'] < values['Low'],
+        values['Volume'] % 1 != 0,
+    ]
+    reasons = ['bad date', 'missing field', 'not a number', 'negative value', 'high below low', 'fractional volume']
+    return pd.Series(np.select(conditions, reasons, default=''), index=raw.index)
+
+
+def normalize_partitions(partitions, reject=None):
+    """Validate, rename and type raw Alpha Vantage frames in one pass.
+
+    Yields typed daily frames (DAILY_COLUMNS; datetime Date, float prices,
+    int64 volume).
+    Rows that fail validation are left out and, when given, passed to
+    `reject(symbol, rows)` with the raw fields renamed and a Reason column.
+    """
+    for symbol, raw in partitions:
+        dates = pd.to_datetime(raw['Date'], format='%Y-%m-%d', errors='coerce')
+        values = {column: pd.to_numeric(raw[field], errors='coerce') for field, column in zip(RAW_FIELDS, DAILY_FIELDS)}
+        reasons = _rejection_reasons(raw, dates, values)
+        bad = (reasons != '').to_numpy()
+        if bad.any() and reject is not None:
+            rows = raw.loc[bad, ['Date'] + RAW_FIELDS].rename(columns=RENAMES)
+            rows['Reason'] = reasons[bad]
+            reject(symbol, rows.reset_index(drop=True))
+        good = ~bad
+        daily = pd.DataFrame({'Date': dates.to_numpy()[good], 'Symbol': symbol})
+        for field in DAILY_FIELDS[:-1]:
+            daily[field] = values[field].to_numpy(dtype=float)[good]
+        daily['Volume'] = values['Volume'].to_numpy()[good].astype('int64')
+        yield symbol, daily
+
+
+def normalize_changed(partitions, report, stored=None, watermarks=None):
+    """normalize_partitions, leaving out symbols without new rows or whose new rows match `stored`.
+
+    See fingerprints.changed_partitions for `watermarks`. Rejected rows go to
+    report['rejected'][symbol] and the fingerprint of every symbol to
+    report['fingerprints'][symbol].
+    """
+    rejected = report.setdefault('rejected', {})
+    fingerprints = report.setdefault('fingerprints', {})
+    yield from changed_partitions(normalize_partitions(partitions, rejected.__setitem__), stored or {}, fingerprints,
+                                  watermarks)
+
+
+def period_partitions(partitions, states=None):
+    """{period: (symbol, rollup) pairs} for every registered period, see resample.resample_partitions."""
+    rollups = resample_partitions(partitions, states=states)
+    return {period: rollup.groupby('Symbol', sort=False) for period, rollup in rollups.items()}
+
+
+def indicator_partitions(partitions, states=None):
+    """Indicator rows after each symbol's stored state; symbols with nothing new are skipped."""
+    states = states or {}
+    for symbol, daily in partitions:
+        rows = compute_indicators(symbol, daily, states.get(symbol))
+        if not rows.empty:
+            yield symbol, rows
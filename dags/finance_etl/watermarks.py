@@ -0,0 +1,70 @@
+"""Per-symbol high-water marks for incremental extraction."""
+import pandas as pd
+
+WATERMARK_COLLECTION = 'etl_watermarks'
+HISTORY_COLLECTION = 'stocks_daily'
+
+
+def get_watermarks(db, symbols):
+    """Return {symbol: last loaded date} for the symbols that have one.
+
+    A watermark is only trusted if the symbol still has stored history, so a
+    dropped or wiped collection triggers a full refetch.
+    """
+    cursor = db[WATERMARK_COLLECTION].find({'_id': {'$in': list(symbols)}})
+    held = set(db[HISTORY_COLLECTION].distinct('Symbol'))
+    return {doc['_id']: doc['last_date'] for doc in cursor if doc['_id'] in held}
+
+
+def set_watermarks(db, last_dates):
+    """Advance each symbol's watermark to the newest loaded date in {symbol: date}."""
+    for symbol, last_date in last_dates.items():
+        db[WATERMARK_COLLECTION].update_one(
+            {'_id': symbol},
+            {'$max': {'last_date': last_date}},
+            upsert=True
+        )
+
+
+def load_history(db, symbol, since=None, context=0):
+    """Read stored daily bars of `symbol` back into Alpha Vantage shape.
+
+    With `since` (a datetime) only the bars after it and the `context` bars
+    up to and including it are read; without it, the whole history.
+    """
+    projection = {'_id': 0, 'Date': 1, 'Open': 1, 'High': 1, 'Low': 1, 'Close': 1, 'Volume': 1}
+    collection = db[HISTORY_COLLECTION]
+    if since is None:
+        docs = collection.find({'Symbol': symbol}, projection)
+    else:
+        # limit(0) would mean no limit
+        before = []
+        if context:
+            before = collection.find({'Symbol': symbol, 'Date': {'$lte': since}}, projection).sort('Date', -1).limit(context)
+        after = collection.find({'Symbol': symbol, 'Date': {'$gt': since}}, projection)
+        docs = list(before) + list(after)
+    history = {}
+    for doc in docs:
+        # Stored as BSON dates; documents loaded before that still hold the string
+        date = doc['Date'] if isinstance(doc['Date'], str) else doc['Date'].strftime('%Y-%m-%d')
+        history[date] = {
+            '1. open': str(doc['Open']),
+            '2. high': str(doc['High']),
+            '3. low': str(doc['Low']),
+            '4. close': str(doc['Close']),
+            '5. volume': str(doc['Volume'])
+        }
+    return history
+
+
+def rows_after(frame, watermark):
+    """The rows of `frame` dated after `watermark` ('YYYY-MM-DD'); all of them without one."""
+    if watermark is None:
+        return frame
+    return frame[frame['Date'] > pd.Timestamp(watermark)]
+
+
+def merge_history(history, new_bars):
+    # Newest first, matching the order Alpha Vantage returns
+    merged = {**history, **new_bars}
+    return {date: merged[date] for date in sorted(merged, reverse=True)}
@@ -1,50 +1,170 @@
 import dash
+import flask
 from dash import dcc, html
-from dash.dependencies import Input, Output, State, ALL
-import pymongo
+from dash.dependencies import ClientsideFunction, Input, Output, State, ALL
+import numpy as np
 import pandas as pd
 import io
 import base64
 import datetime
+import os
+import sys
+from urllib.parse import urlencode
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'dags'))
+from finance_etl.indicators import INDICATOR_COLLECTION, INDICATORS
+from finance_etl.load import current_load_generation
+from finance_etl.metadata import find_company_metadata
+from finance_etl.mongo import get_database
+from finance_etl.snapshots import SnapshotStore
+from cache import QueryCache
+from crosssection import cross_section, fetch_matrix, frames_matrix
+from export import export_stream
+
+SERIES_FIELDS = ['Open', 'High', 'Low', 'Close', 'Volume']
+STOCK_TYPES = ['daily', 'weekly', 'monthly', 'quarterly', 'yearly']
+# The comparison chart plots every selected symbol on shared rows, thinned to about this many
+MAX_COMPARE_POINTS = 500
+COMPARE_WINDOWS = [20, 60, 120, 250]
+
+# Mongo is reached through the shared lazy client (finance_etl.mongo); nothing connects at import
+# With ETL_SNAPSHOT_DIR, series are read from the memory-mapped snapshot files the DAG publishes
+SNAPSHOT_DIR = os.environ.get('ETL_SNAPSHOT_DIR')
+snapshots = SnapshotStore(SNAPSHOT_DIR) if SNAPSHOT_DIR else None
+
+
+def data_generation():
+    # The snapshot is published after the load generation is bumped, so both are watched
+    generation = current_load_generation(get_database())
+    return (generation, snapshots.refresh()) if snapshots else generation
+
+
+# Query results are kept in memory until the ETL publishes a new load generation or snapshot
+query_cache = QueryCache(data_generation, maxsize=256, check_interval=60)
+
+
+def read_snapshot(dataset, symbol, columns):
+    return snapshots.read(dataset, symbol, columns) if snapshots else None
+
+
+def load_series(stock_type, symbol):
+    def query():
+        frame = read_snapshot(stock_type, symbol, ['Date'] + SERIES_FIELDS)
+        if frame is not None:
+            return frame
+        projection = {'_id': 0, 'Date': 1, **{field: 1 for field in SERIES_FIELDS}}
+        cursor = get_database()[f"stocks_{stock_type}"].find({"Symbol": symbol}, projection).sort('Date', 1)
+        return pd.DataFrame(list(cursor), columns=['Date'] + SERIES_FIELDS)
+    return query_cache.get_or_load(('series', stock_type, symbol), query)
+
+
+def load_indicators(symbol):
+    def query():
+        frame = read_snapshot('indicators', symbol, ['Date'] + list(INDICATORS))
+        if frame is not None:
+            return frame
+        projection = {'_id': 0, 'Date': 1, **{field: 1 for field in INDICATORS}}
+        cursor = get_database()[INDICATOR_COLLECTION].find({"Symbol": symbol}, projection).sort('Date', 1)
+        return pd.DataFrame(list(cursor), columns=['Date'] + list(INDICATORS))
+    return query_cache.get_or_load(('indicators', symbol), query)
+
+
+def series_payload(stock_type, symbol):
+    """Every plottable column of (stock_type, symbol) as compact JSON-ready lists, indicators included for daily."""
+    def build():
+        data = load_series(stock_type, symbol)
+        if stock_type == 'daily':
+            data = data.merge(load_indicators(symbol), on='Date', how='left')
+        payload = {'period': stock_type, 'symbol': symbol,
+                   'Date': pd.to_datetime(data['Date']).dt.strftime('%Y-%m-%d').tolist()}
+        for column in data.columns.drop('Date'):
+            values = np.round(data[column].to_numpy(dtype=float), 6)
+            # NaN (e.g. indicator warm-up) is not valid JSON
+            payload[column] = np.where(np.isnan(values), None, values).tolist()
+        return payload
+    return query_cache.get_or_load(('payload', stock_type, symbol), build)
+
+
+def load_symbols(stock_type):
+    def query():
+        held = snapshots.symbols(stock_type) if snapshots else None
+        return held if held is not None else sorted(get_database()[f"stocks_{stock_type}"].distinct('Symbol'))
+    return query_cache.get_or_load(('symbols', stock_type), query)
+
+
+def load_cross_section(stock_type, symbols, window):
+    """Analytics of a sorted tuple of symbols; the matrix and each window's results are cached separately."""
+    def matrix():
+        frames = [read_snapshot(stock_type, symbol, ['Date', 'Close']) for symbol in symbols]
+        if all(frame is not None for frame in frames):
+            return frames_matrix(frames)
+        return fetch_matrix(get_database(), stock_type, list(symbols))
+
+    def analytics():
+        dates, closes = query_cache.get_or_load(('matrix', stock_type, symbols), matrix)
+        return cross_section(dates, closes, window)
+    return query_cache.get_or_load(('cross-section', stock_type, symbols, window), analytics)
+
+
+def load_company_info(symbol):
+    return query_cache.get_or_load(('metadata', symbol),
+                                   lambda: find_company_metadata(get_database(), [symbol]).get(symbol, {}))
 
-# MongoDB connection
-try:
-    client = pymongo.MongoClient("mongodb+srv://<username>:<password>@<cluster-name>.mongodb.net/<database-name>?retryWrites=true&w=majority")
-    db = client["finance_metadata"]
-except:
-    print("Connection error")
-
-static_info = db["stocks_daily"].find_one({})
-
-# Extract required information
-comp_name = static_info.get('Company Name', 'N/A')
-market_cap = static_info.get('Market Cap', 'N/A')
-beta_5yr = static_info.get('Beta (5Y Monthly)', 'N/A')
-pe_ratio = static_info.get('PE Ratio (TTM)', 'N/A')
-eps = static_info.get('EPS (TTM)', 'N/A')
-earning_date = static_info.get('Earnings Date', 'N/A')
-fwd_div = static_info.get('Forward Dividend & Yield', 'N/A')
-ex_dividend_date = static_info.get('Ex-Dividend Date', 'N/A')
-target_est = static_info.get('1y Target Est', 'N/A')
 
 app = dash.Dash(__name__)
 
+
+@app.server.route('/cache-metrics')
+def cache_metrics():
+    return query_cache.metrics()
+
+
+@app.server.route('/series')
+def series_data():
+    # /series?period=daily&symbol=AAPL, fetched by the browser (assets/charts.js) into the series store
+    args = flask.request.args
+    stock_type, symbol = args.get('period', 'daily'), args.get('symbol')
+    if not symbol or stock_type not in STOCK_TYPES:
+        return flask.Response('symbol and a valid period are required', status=400)
+    return flask.jsonify(series_payload(stock_type, symbol))
+
+
+@app.server.route('/export')
+def export_data():
+    # /export?period=daily&symbols=AAPL,MSFT&format=csv|ndjson|parquet[&gzip=1][&start=YYYY-MM-DD][&end=YYYY-MM-DD]
+    args = flask.request.args
+    symbols = [symbol for symbol in args.get('symbols', '').split(',') if symbol]
+    stock_type = args.get('period', 'daily')
+    if not symbols or stock_type not in STOCK_TYPES:
+        return flask.Response('symbols and a valid period are required', status=400)
+    try:
+        chunks, content_type, filename = export_stream(get_database(), stock_type, symbols, args.get('format', 'csv'),
+                                                       args.get('start'), args.get('end'), args.get('gzip') == '1')
+    except ValueError as exc:
+        return flask.Response(str(exc), status=400)
+    return flask.Response(flask.stream_with_context(chunks), mimetype=content_type,
+                          headers={'Content-Disposition': f'attachment; filename="{filename}"'})
+
+
 # Define the layout with styling
 app.layout = html.Div([
     html.Div([html.Div([html.H1("Finance Data Analyzer", style={'height':'0px', 'text-align': 'center', 'margin-bottom': '20px', 'color': '#018049'})],style={'width':'40%'}),
               
             html.Div([
-                html.Button('Download Data', id='download-button', n_clicks=0, style={'margin-top': '5px',  'font-size': '16px', 'background-color': '#4CAF50', 'border': 'none', 'color': 'white', 'text-align': 'center', 'text-decoration': 'none', 'display': 'inline-block', 'border-radius': '8px', 'cursor':'pointer'}),
+                html.A(
+                    html.Button('Download Data', id='download-button', n_clicks=0, style={'margin-top': '5px',  'font-size': '16px', 'background-color': '#4CAF50', 'border': 'none', 'color': 'white', 'text-align': 'center', 'text-decoration': 'none', 'display': 'inline-block', 'border-radius': '8px', 'cursor':'pointer'}),
+                    id='download-link', href='', download=''),
                     dcc.Dropdown(id='download-format',
                                  options=[
                                      {'label': 'CSV', 'value': 'csv'},
-                                     {'label': 'JSON', 'value': 'json'}
+                                     {'label': 'NDJSON', 'value': 'ndjson'},
+                                     {'label': 'Parquet', 'value': 'parquet'},
+                                     {'label': 'CSV (gzip)', 'value': 'csv.gz'},
+                                     {'label': 'NDJSON (gzip)', 'value': 'ndjson.gz'}
                                  ],
                                  value='csv',
-                                 style={'width': '100px', 'margin-left':'10px', 'margin-top':'3px'})
-            ], style={'display':'flex', 'width':'30%', 'text-align': 'left', 'margin-top':'15px'}),
-        
-        dcc.Download(id="download-data")
+                                 style={'width': '140px', 'margin-left':'10px', 'margin-top':'3px'})
+            ], style={'display':'flex', 'width':'30%', 'text-align': 'left', 'margin-top':'15px'})
 
               ], style={'display':'flex', 'justify-content':'space-between'}),
     
@@ -56,6 +176,7 @@ app.layout = html.Div([
                     {'label': 'Daily', 'value': 'daily'},
                     {'label': 'Weekly', 'value': 'weekly'},
                     {'label': 'Monthly', 'value': 'monthly'},
+                    {'label': 'Quarterly', 'value': 'quarterly'},
                     {'label': 'Yearly', 'value': 'yearly'}
                 ],
                 value='weekly',  # Default selected option
@@ -82,11 +203,19 @@ app.layout = html.Div([
                     {'label': 'High', 'value': 'High'},
                     {'label': 'Low', 'value': 'Low'},
                     {'label': 'Volume', 'value': 'Volume'}
-                ],
+                ] + [{'label': f'{name.replace("_", " ")} (daily)', 'value': name} for name in INDICATORS],
                 value=['High'],  # Default selected values
                 multi=True,
                 style={'width': '80%', 'margin-bottom': '20px'}
-            )
+            ),
+            dcc.DatePickerRange(
+                id='date-range',
+                clearable=True,
+                display_format='YYYY-MM-DD',
+                style={'margin-bottom': '20px'}
+            ),
+            # All columns of the selected symbol and period; series, date window and zoom are applied in the browser
+            dcc.Store(id='series-store')
         ], style={'display':'flex', 'justify-content': 'space-between', 'padding':'20px','margin-top':'50px'}),
         
         html.Div([
@@ -99,79 +228,135 @@ app.layout = html.Div([
         ], style={'flex': '30%'})
     ], style={'display': 'flex', 'justify-content': 'space-between', 'margin-top': '20px'})
 
-    ])
+    ]),
+
+    # Cross-sectional view: many symbols compared on one aligned matrix of closes
+    html.Div([
+        html.H3('Compare Symbols'),
+        html.Div([
+            dcc.Dropdown(id='compare-symbols', multi=True, placeholder='Symbols to compare',
+                         style={'width': '60%', 'margin-right': '10px'}),
+            dcc.Dropdown(
+                id='compare-period',
+                options=[{'label': stock_type.capitalize(), 'value': stock_type} for stock_type in STOCK_TYPES],
+                value='daily',
+                clearable=False,
+                style={'width': '140px', 'margin-right': '10px'}
+            ),
+            dcc.Dropdown(
+                id='compare-window',
+                options=[{'label': f'Last {window} periods', 'value': window} for window in COMPARE_WINDOWS],
+                value=60,
+                clearable=False,
+                style={'width': '180px'}
+            )
+        ], style={'display': 'flex', 'margin-bottom': '20px'}),
+        dcc.Graph(id='compare-performance', style={'height': '400px'}),
+        html.Div([
+            dcc.Graph(id='compare-correlation', style={'flex': '50%', 'height': '500px'}),
+            dcc.Graph(id='compare-strength', style={'flex': '50%', 'height': '500px'})
+        ], style={'display': 'flex'})
+    ], style={'padding': '20px', 'margin-top': '30px'})
 ])
 
-# Define callback to update graph
-@app.callback(
+# Fetch the selected series once (or take it from the browser's prefetch cache) and
+# prefetch the neighbouring symbols and periods, see assets/charts.js
+app.clientside_callback(
+    ClientsideFunction(namespace='charts', function_name='loadSeries'),
+    Output('series-store', 'data'),
+    [Input('stock-type-dropdown', 'value'),
+     Input('symbol-dropdown', 'value')],
+    [State('stock-type-dropdown', 'options'),
+     State('symbol-dropdown', 'options')]
+)
+
+# Picking series, the date window or zooming re-slices the stored columns without a server round trip
+app.clientside_callback(
+    ClientsideFunction(namespace='charts', function_name='renderChart'),
     Output('stock-graph', 'figure'),
+    [Input('series-store', 'data'),
+     Input('timeframe-dropdown', 'value'),
+     Input('date-range', 'start_date'),
+     Input('date-range', 'end_date'),
+     Input('stock-graph', 'relayoutData')]
+)
+
+# Point the download button at the streaming export endpoint for the current selection
+@app.callback(
+    Output('download-link', 'href'),
     [Input('stock-type-dropdown', 'value'),
      Input('symbol-dropdown', 'value'),
-     Input('timeframe-dropdown', 'value')]
+     Input('download-format', 'value'),
+     Input('date-range', 'start_date'),
+     Input('date-range', 'end_date')]
 )
-def update_graph(stock_type, symbol, values):
-    collection_name = f"stocks_{stock_type}"
-    
-    # Fetch stock data from MongoDB
-    query = {"Symbol": symbol}
-    data = pd.DataFrame(list(db[collection_name].find(query, {'_id': 0})))
-    
-    data.set_index('Date', inplace=True)
+def update_download_link(stock_type, symbol, download_format, start_date=None, end_date=None):
+    file_format, _, compression = download_format.partition('.')
+    params = {'period': stock_type, 'symbols': symbol, 'format': file_format}
+    if compression:
+        params['gzip'] = '1'
+    if start_date:
+        params['start'] = start_date[:10]
+    if end_date:
+        params['end'] = end_date[:10]
+    return '/export?' + urlencode(params)
 
-    
-    
-    # Create traces for selected values
-    traces = []
-    for value in values:
-        traces.append({
-            'x': data.index,
-            'y': data[value],
-            'name': value.capitalize()  # Capitalize value for better display
-        })
-    
-    return {
-        'data': traces,
+@app.callback(
+    Output('compare-symbols', 'options'),
+    [Input('compare-period', 'value')]
+)
+def update_compare_options(stock_type):
+    return [{'label': symbol, 'value': symbol} for symbol in load_symbols(stock_type)]
+
+
+@app.callback(
+    [Output('compare-performance', 'figure'),
+     Output('compare-correlation', 'figure'),
+     Output('compare-strength', 'figure')],
+    [Input('compare-symbols', 'value'),
+     Input('compare-period', 'value'),
+     Input('compare-window', 'value')]
+)
+def update_comparison(symbols, stock_type, window):
+    symbols = tuple(sorted(set(symbols or [])))
+    if not symbols:
+        empty = {'data': [], 'layout': {'title': 'Select symbols to compare'}}
+        return empty, empty, empty
+    result = load_cross_section(stock_type, symbols, window)
+    dates, performance = result['dates'], result['performance']
+    rows = np.unique(np.linspace(0, len(dates) - 1, min(len(dates), MAX_COMPARE_POINTS)).astype(int))
+    # Every trace repeats the x values, so they are sent as short day strings
+    x = np.datetime_as_string(dates[rows], unit='D')
+    performance = np.round(performance[rows], 4)
+    performance_figure = {
+        'data': [{'x': x, 'y': performance[:, index], 'name': symbol, 'mode': 'lines'}
+                 for index, symbol in enumerate(symbols)],
         'layout': {
-            'title': f'{symbol} Stock Data ({stock_type.capitalize()})',
+            'title': f'Growth of 1 ({stock_type.capitalize()})',
             'xaxis': {'title': 'Date', 'automargin': True},
-            'yaxis': {'title': 'Value', 'automargin':True},
+            'yaxis': {'title': 'Normalized close', 'automargin': True},
             'margin': {'l': 40, 'b': 40, 't': 40, 'r': 40},
             'hovermode': 'closest'
         }
     }
+    correlation_figure = {
+        'data': [{'type': 'heatmap', 'z': result['correlation'], 'x': symbols, 'y': symbols,
+                  'zmin': -1, 'zmax': 1, 'colorscale': 'RdBu'}],
+        'layout': {'title': f'Return correlation, last {window} periods', 'margin': {'l': 60, 'b': 60, 't': 40, 'r': 20}}
+    }
+    # Strongest first
+    order = np.argsort(-np.nan_to_num(result['relative_strength'], nan=-np.inf))
+    strength_figure = {
+        'data': [{'type': 'bar', 'x': [symbols[index] for index in order],
+                  'y': result['relative_strength'][order] * 100}],
+        'layout': {
+            'title': f'Return vs. equal-weighted average, last {window} periods',
+            'yaxis': {'title': '%', 'automargin': True},
+            'margin': {'l': 40, 'b': 60, 't': 40, 'r': 20}
+        }
+    }
+    return performance_figure, correlation_figure, strength_figure
 
-# Define callback to handle download
-@app.callback(
-    Output("download-data", "data"),
-    [Input('download-button', 'n_clicks')],
-    [State('stock-type-dropdown', 'value'),
-     State('symbol-dropdown', 'value'),
-     State('timeframe-dropdown', 'value'),
-     State('download-format', 'value')],
-    prevent_initial_call=True
-)
-def download_data(n_clicks, stock_type, symbol, values, download_format):
-    if n_clicks > 0:
-        collection_name = f"stocks_{stock_type}"
-        
-        # Fetch stock data from MongoDB
-        query = {"Symbol": symbol}
-        data = pd.DataFrame(list(db[collection_name].find(query, {'_id': 0})))
-        data.set_index('Date', inplace=True)
-        
-        # Prepare data for download
-        if download_format == 'csv':
-            csv_string = data.to_csv(index=True, encoding='utf-8')
-            file_content = csv_string
-            file_extension = 'csv'
-        elif download_format == 'json':
-            json_string = data.to_json(orient='records')
-            file_content = json_string
-            file_extension = 'json'
-        
-        return dict(content=file_content, filename=f"{symbol}_{stock_type}_data.{file_extension}")
-    
-    return None
 
 @app.callback(
     Output('company-info', 'children'),
@@ -179,7 +364,7 @@ def download_data(n_clicks, stock_type, symbol, values, download_format):
 )
 def update_company_info(symbol):
     # Fetch static information from MongoDB based on selected symbol
-    static_info = db["stocks_daily"].find_one({"Symbol": symbol})
+    static_info = load_company_info(symbol)
 
     # Extract required information
     comp_name = static_info.get('Company Name', 'N/A')
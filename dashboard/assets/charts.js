@@ -0,0 +1,276 @@
+// Clientside callbacks for the stock chart (registered in app.py).
+//
+// loadSeries fetches every column of one (period, symbol) from /series into
+// the series store, keeping recent payloads in memory and prefetching the
+// neighbouring symbols and periods while the browser is idle. renderChart
+// slices the stored columns to the selected series, date window and zoom and
+// downsamples them, so none of those interactions reach the server.
+
+(function () {
+    // Traces are reduced to roughly the plot's pixel width
+    var MAX_CHART_POINTS = 1000;
+    // Payloads are refetched after this long, so a new ETL load shows up without a reload
+    var CACHE_TTL_MS = 10 * 60 * 1000;
+    var CACHE_SIZE = 40;
+
+    var cache = new Map();
+    // Zoomed x range per store key, reset when another series is loaded
+    var zoom = {key: null, range: null};
+
+    function cacheKey(period, symbol) {
+        return period + '|' + symbol;
+    }
+
+    function fetchSeries(period, symbol) {
+        var key = cacheKey(period, symbol);
+        var entry = cache.get(key);
+        if (entry && Date.now() - entry.at < CACHE_TTL_MS) {
+            // Re-inserted so the Map order stays least recently used first
+            cache.delete(key);
+            cache.set(key, entry);
+            return entry.promise;
+        }
+        var url = '/series?' + new URLSearchParams({period: period, symbol: symbol}).toString();
+        var promise = fetch(url).then(function (response) {
+            if (!response.ok) {
+                throw new Error(response.status + ' ' + response.statusText);
+            }
+            return response.json();
+        });
+        // Failed requests are not cached
+        promise.catch(function () {
+            cache.delete(key);
+        });
+        cache.delete(key);
+        cache.set(key, {promise: promise, at: Date.now()});
+        while (cache.size > CACHE_SIZE) {
+            cache.delete(cache.keys().next().value);
+        }
+        return promise;
+    }
+
+    function neighbours(options, value) {
+        var values = (options || []).map(function (option) {
+            return option.value;
+        });
+        var index = values.indexOf(value);
+        return index < 0 ? [] : [values[index - 1], values[index + 1]].filter(function (item) {
+            return item !== undefined;
+        });
+    }
+
+    function whenIdle(callback) {
+        (window.requestIdleCallback || function (fn) {
+            return setTimeout(fn, 200);
+        })(callback);
+    }
+
+    function prefetch(period, symbol, periodOptions, symbolOptions) {
+        whenIdle(function () {
+            neighbours(symbolOptions, symbol).forEach(function (other) {
+                fetchSeries(period, other).catch(function () {});
+            });
+            neighbours(periodOptions, period).forEach(function (other) {
+                fetchSeries(other, symbol).catch(function () {});
+            });
+        });
+    }
+
+    function toTime(value) {
+        // Payload dates are YYYY-MM-DD; plotly ranges look like "YYYY-MM-DD HH:MM:SS.sss"
+        var text = String(value);
+        return Date.parse(text.length > 10 ? text.replace(' ', 'T') + 'Z' : text);
+    }
+
+    // Largest-Triangle-Three-Buckets, the indices of `threshold` points keeping the line's shape
+    function lttbIndices(x, y, threshold) {
+        var n = x.length;
+        var i;
+        if (threshold >= n || threshold < 3) {
+            return Array.from({length: n}, function (_, index) {
+                return index;
+            });
+        }
+        var edges = [];
+        for (i = 0; i < threshold - 1; i++) {
+            edges.push(Math.floor(1 + i * (n - 2) / (threshold - 2)));
+        }
+        var selected = [0];
+        var a = 0;
+        for (i = 0; i < threshold - 2; i++) {
+            var start = edges[i], end = edges[i + 1];
+            var nextEnd = i + 2 < edges.length ? edges[i + 2] : n;
+            var avgX = 0, avgY = 0, j;
+            for (j = end; j < nextEnd; j++) {
+                avgX += x[j];
+                avgY += y[j];
+            }
+            avgX /= Math.max(nextEnd - end, 1);
+            avgY /= Math.max(nextEnd - end, 1);
+            var best = start, bestArea = -1;
+            for (j = start; j < end; j++) {
+                var area = Math.abs((x[a] - avgX) * (y[j] - y[a]) - (x[a] - x[j]) * (avgY - y[a]));
+                if (area > bestArea) {
+                    bestArea = area;
+                    best = j;
+                }
+            }
+            a = best;
+            selected.push(a);
+        }
+        selected.push(n - 1);
+        return selected;
+    }
+
+    // Gaps (e.g. indicator warm-up rows) are filled so they do not poison the bucket areas
+    function filled(values) {
+        var out = values.slice();
+        var last = null, i;
+        for (i = 0; i < out.length; i++) {
+            if (out[i] === null) {
+                out[i] = last;
+            } else {
+                last = out[i];
+            }
+        }
+        var first = out.find(function (value) {
+            return value !== null;
+        });
+        return out.map(function (value) {
+            return value === null ? (first === undefined ? 0 : first) : value;
+        });
+    }
+
+    // Rows to plot: each column gets its share of the budget and the kept rows are merged
+    function downsample(x, columns) {
+        if (x.length <= MAX_CHART_POINTS || !columns.length) {
+            return null;
+        }
+        var threshold = Math.max(3, Math.floor(MAX_CHART_POINTS / columns.length));
+        var keep = new Set();
+        columns.forEach(function (column) {
+            lttbIndices(x, filled(column), threshold).forEach(function (index) {
+                keep.add(index);
+            });
+        });
+        return Array.from(keep).sort(function (left, right) {
+            return left - right;
+        });
+    }
+
+    function zoomedRange(relayout) {
+        if (!relayout) {
+            return undefined;
+        }
+        if (relayout['xaxis.autorange']) {
+            return null;
+        }
+        if (relayout['xaxis.range[0]'] !== undefined) {
+            return [relayout['xaxis.range[0]'], relayout['xaxis.range[1]']];
+        }
+        if (relayout['xaxis.range']) {
+            return relayout['xaxis.range'];
+        }
+        return undefined;
+    }
+
+    function label(value) {
+        var text = value.replace(/_/g, ' ');
+        return text.charAt(0).toUpperCase() + text.slice(1).toLowerCase();
+    }
+
+    window.dash_clientside = window.dash_clientside || {};
+    window.dash_clientside.charts = {
+        loadSeries: function (period, symbol, periodOptions, symbolOptions) {
+            if (!period || !symbol) {
+                return window.dash_clientside.no_update;
+            }
+            var loaded = fetchSeries(period, symbol).catch(function (error) {
+                return {period: period, symbol: symbol, Date: [], error: String(error)};
+            });
+            prefetch(period, symbol, periodOptions, symbolOptions);
+            return loaded;
+        },
+
+        renderChart: function (data, values, startDate, endDate, relayout) {
+            if (!data) {
+                return window.dash_clientside.no_update;
+            }
+            var key = cacheKey(data.period, data.symbol);
+            var triggered = (window.dash_clientside.callback_context.triggered || []).map(function (item) {
+                return item.prop_id;
+            });
+            if (zoom.key !== key) {
+                zoom = {key: key, range: null};
+            } else if (triggered.indexOf('stock-graph.relayoutData') >= 0) {
+                var range = zoomedRange(relayout);
+                if (range === undefined) {
+                    // Only the y axis or other layout changed
+                    return window.dash_clientside.no_update;
+                }
+                zoom.range = range;
+            }
+
+            // Indicators only exist on daily bars, so unknown columns are skipped
+            values = (values || []).filter(function (value) {
+                return Object.prototype.hasOwnProperty.call(data, value);
+            });
+            var dates = data.Date;
+            var first = 0, last = dates.length;
+            var lower = startDate ? startDate.slice(0, 10) : null;
+            var upper = endDate ? endDate.slice(0, 10) : null;
+            if (zoom.range) {
+                var zoomStart = String(zoom.range[0]).slice(0, 10);
+                var zoomEnd = String(zoom.range[1]).slice(0, 10);
+                lower = lower && lower > zoomStart ? lower : zoomStart;
+                upper = upper && upper < zoomEnd ? upper : zoomEnd;
+            }
+            // Dates are sorted ISO strings, so the window is found by comparing them as text
+            while (first < last && lower && dates[first] < lower) {
+                first++;
+            }
+            while (last > first && upper && dates[last - 1] > upper) {
+                last--;
+            }
+            // One bar either side keeps the line running to the edges of a zoomed plot
+            if (zoom.range) {
+                first = Math.max(first - 1, 0);
+                last = Math.min(last + 1, dates.length);
+            }
+            var x = dates.slice(first, last);
+            var columns = values.map(function (value) {
+                return data[value].slice(first, last);
+            });
+            var keep = downsample(x.map(toTime), columns);
+            if (keep) {
+                x = keep.map(function (index) {
+                    return x[index];
+                });
+                columns = columns.map(function (column) {
+                    return keep.map(function (index) {
+                        return column[index];
+                    });
+                });
+            }
+
+            var title = data.symbol + ' Stock Data (' + label(data.period) + ')';
+            var layout = {
+                title: data.error ? title + ' - unavailable' : title,
+                xaxis: {title: 'Date', automargin: true},
+                yaxis: {title: 'Value', automargin: true},
+                margin: {l: 40, b: 40, t: 40, r: 40},
+                hovermode: 'closest',
+                uirevision: key
+            };
+            if (zoom.range) {
+                layout.xaxis.range = zoom.range;
+            }
+            return {
+                data: values.map(function (value, index) {
+                    return {x: x, y: columns[index], name: label(value)};
+                }),
+                layout: layout
+            };
+        }
+    };
+})();
@@ -0,0 +1,68 @@
+"""In-process LRU cache for dashboard queries, invalidated when the ETL publishes a new load."""
+import threading
+import time
+from collections import OrderedDict
+
+
+class QueryCache:
+    """LRU cache of query results keyed by any hashable key.
+
+    `generation` is a callable returning the ETL load generation. It is polled
+    at most every `check_interval` seconds and a change clears the cache, so
+    results never outlive the load they were read from by more than that.
+    """
+
+    def __init__(self, generation, maxsize=256, check_interval=60):
+        self.generation = generation
+        self.maxsize = maxsize
+        self.check_interval = check_interval
+        self.entries = OrderedDict()
+        self.lock = threading.Lock()
+        self.current_generation = None
+        self.checked_at = 0.0
+        self.stats = {'hits': 0, 'misses': 0, 'evictions': 0, 'invalidations': 0}
+
+    def _check_generation(self):
+        now = time.monotonic()
+        if now - self.checked_at < self.check_interval:
+            return
+        self.checked_at = now
+        generation = self.generation()
+        with self.lock:
+            if generation != self.current_generation:
+                if self.entries:
+                    self.stats['invalidations'] += 1
+                self.entries.clear()
+                self.current_generation = generation
+
+    def get_or_load(self, key, loader):
+        self._check_generation()
+        with self.lock:
+            if key in self.entries:
+                self.entries.move_to_end(key)
+                self.stats['hits'] += 1
+                return self.entries[key]
+            self.stats['misses'] += 1
+        value = loader()
+        with self.lock:
+            self.entries[key] = value
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.maxsize:
+                self.entries.popitem(last=False)
+                self.stats['evictions'] += 1
+        return value
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+
+    def metrics(self):
+        with self.lock:
+            lookups = self.stats['hits'] + self.stats['misses']
+            return {
+                **self.stats,
+                'entries': len(self.entries),
+                'maxsize': self.maxsize,
+                'hit_ratio': self.stats['hits'] / lookups if lookups else None,
+                'generation': self.current_generation
+            }
@@ -0,0 +1,94 @@
+"""Cross-sectional analytics over many symbols at once, on one wide (date x symbol) matrix."""
+import numpy as np
+
+BATCH_SIZE = 10000
+# Fewer overlapping returns than this leave a correlation undefined
+MIN_PERIODS = 3
+
+
+def fetch_matrix(db, stock_type, symbols, field='Close'):
+    """(dates, matrix) of `field` for `symbols` from a single query; rows are dates, columns follow `symbols`."""
+    cursor = db[f"stocks_{stock_type}"].find({'Symbol': {'$in': list(symbols)}},
+                                             {'_id': 0, 'Symbol': 1, 'Date': 1, field: 1})
+    columns = {symbol: index for index, symbol in enumerate(symbols)}
+    symbol_index, dates, values = [], [], []
+    for doc in cursor.batch_size(BATCH_SIZE):
+        symbol_index.append(columns[doc['Symbol']])
+        dates.append(doc['Date'])
+        values.append(doc.get(field))
+    return aligned_matrix(np.asarray(symbol_index, dtype=np.intp), dates, values, len(symbols))
+
+
+def frames_matrix(frames, field='Close'):
+    """(dates, matrix) from one frame with Date and `field` per column, e.g. read from snapshot files."""
+    symbol_index = np.concatenate([np.full(len(frame), index, dtype=np.intp) for index, frame in enumerate(frames)])
+    dates = np.concatenate([frame['Date'].to_numpy(dtype='datetime64[ns]') for frame in frames])
+    values = np.concatenate([frame[field].to_numpy(dtype=float) for frame in frames])
+    return aligned_matrix(symbol_index, dates, values, len(frames))
+
+
+def aligned_matrix(symbol_index, dates, values, width):
+    """Scatter (column, date, value) triples into a matrix over the sorted union of dates; gaps are NaN."""
+    unique_dates, row_index = np.unique(np.asarray(dates, dtype='datetime64[ns]'), return_inverse=True)
+    matrix = np.full((len(unique_dates), width), np.nan)
+    matrix[row_index, symbol_index] = np.asarray(values, dtype=float)
+    return unique_dates, matrix
+
+
+def forward_fill(matrix):
+    """Carry the last valid value of every column down over its gaps."""
+    rows = np.where(np.isnan(matrix), 0, np.arange(len(matrix))[:, None])
+    np.maximum.accumulate(rows, axis=0, out=rows)
+    return matrix[rows, np.arange(matrix.shape[1])]
+
+
+def normalized_performance(matrix):
+    """Each column divided by its first valid value, i.e. the growth of 1 held from the start."""
+    first = np.argmax(~np.isnan(matrix), axis=0)
+    return matrix / matrix[first, np.arange(matrix.shape[1])]
+
+
+def log_returns(matrix):
+    return np.diff(np.log(matrix), axis=0)
+
+
+def correlation_matrix(returns):
+    """Pairwise-complete Pearson correlation of the columns of `returns`, as matrix products."""
+    valid = (~np.isnan(returns)).astype(float)
+    x = np.where(np.isnan(returns), 0.0, returns)
+    # Counts, sums and sums of squares over the rows where both columns have a value
+    count = valid.T @ valid
+    sum_x = x.T @ valid
+    sum_xx = (x * x).T @ valid
+    sum_xy = x.T @ x
+    with np.errstate(invalid='ignore', divide='ignore'):
+        covariance = count * sum_xy - sum_x * sum_x.T
+        variance = (count * sum_xx - sum_x ** 2) * (count * sum_xx - sum_x ** 2).T
+        correlation = covariance / np.sqrt(variance)
+    correlation[count < MIN_PERIODS] = np.nan
+    return np.clip(correlation, -1.0, 1.0)
+
+
+def relative_strength(matrix, window):
+    """Return of every column over the last `window` rows, and that return relative to the equal-weighted mean."""
+    filled = forward_fill(matrix)
+    start = filled[max(len(filled) - 1 - window, 0)]
+    returns = filled[-1] / start - 1
+    universe = np.nanmean(returns) if np.isfinite(returns).any() else np.nan
+    return returns, (1 + returns) / (1 + universe) - 1
+
+
+def cross_section(dates, matrix, window):
+    """Normalized performance, trailing-window return correlations and relative strength of `matrix`."""
+    if not len(dates):
+        empty = np.empty((0, matrix.shape[1]))
+        return {'dates': dates, 'performance': empty, 'correlation': np.full((matrix.shape[1],) * 2, np.nan),
+                'returns': np.full(matrix.shape[1], np.nan), 'relative_strength': np.full(matrix.shape[1], np.nan)}
+    returns, strength = relative_strength(matrix, window)
+    return {
+        'dates': dates,
+        'performance': normalized_performance(matrix),
+        'correlation': correlation_matrix(log_returns(matrix)[-window:]),
+        'returns': returns,
+        'relative_strength': strength,
+    }
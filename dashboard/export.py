@@ -0,0 +1,131 @@
+"""Streaming exports straight from a Mongo cursor, one batch in memory at a time."""
+import csv
+import io
+import json
+import zlib
+from datetime import datetime
+
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+from finance_etl.metadata import METADATA_FIELDS, find_company_metadata
+
+EXPORT_FIELDS = ['Date', 'Symbol', 'Open', 'High', 'Low', 'Close', 'Volume']
+CONTENT_TYPES = {
+    'csv': 'text/csv',
+    'ndjson': 'application/x-ndjson',
+    'parquet': 'application/vnd.apache.parquet',
+}
+BATCH_SIZE = 5000
+
+
+def export_cursor(db, stock_type, symbols, start_date=None, end_date=None):
+    query = {'Symbol': {'$in': symbols}}
+    if start_date or end_date:
+        query['Date'] = {}
+        if start_date:
+            query['Date']['$gte'] = datetime.strptime(start_date, '%Y-%m-%d')
+        if end_date:
+            query['Date']['$lte'] = datetime.strptime(end_date, '%Y-%m-%d')
+    projection = {'_id': 0, **{field: 1 for field in EXPORT_FIELDS}}
+    cursor = db[f"stocks_{stock_type}"].find(query, projection).sort([('Symbol', 1), ('Date', 1)])
+    return cursor.batch_size(BATCH_SIZE)
+
+
+def iter_batches(db, cursor, symbols):
+    """Yield lists of rows with company metadata attached, BATCH_SIZE rows at a time."""
+    metadata = find_company_metadata(db, symbols)
+    batch = []
+    for doc in cursor:
+        row = {field: doc.get(field) for field in EXPORT_FIELDS}
+        if isinstance(row['Date'], datetime):
+            row['Date'] = row['Date'].strftime('%Y-%m-%d')
+        meta = metadata.get(doc['Symbol'], {})
+        row.update({field: meta.get(field) for field in METADATA_FIELDS})
+        batch.append(row)
+        if len(batch) == BATCH_SIZE:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+def csv_chunks(batches):
+    header = True
+    for batch in batches:
+        buffer = io.StringIO()
+        writer = csv.DictWriter(buffer, fieldnames=EXPORT_FIELDS + METADATA_FIELDS)
+        if header:
+            writer.writeheader()
+            header = False
+        writer.writerows(batch)
+        yield buffer.getvalue().encode('utf-8')
+
+
+def ndjson_chunks(batches):
+    for batch in batches:
+        yield ''.join(json.dumps(row) + '\n' for row in batch).encode('utf-8')
+
+
+class _ChunkSink(io.RawIOBase):
+    """Write-only file that hands back whatever was written since the last drain()."""
+
+    def __init__(self):
+        self.chunks = []
+        self.position = 0
+
+    def writable(self):
+        return True
+
+    def write(self, data):
+        self.chunks.append(bytes(data))
+        self.position += len(data)
+        return len(data)
+
+    def tell(self):
+        return self.position
+
+    def drain(self):
+        data = b''.join(self.chunks)
+        self.chunks = []
+        return data
+
+
+def parquet_chunks(batches):
+    # One row group per batch; string metadata columns keep a fixed schema across batches
+    schema = pa.schema(
+        [('Date', pa.string()), ('Symbol', pa.string())]
+        + [(field, pa.float64()) for field in EXPORT_FIELDS[2:]]
+        + [(field, pa.string()) for field in METADATA_FIELDS]
+    )
+    sink = _ChunkSink()
+    writer = pq.ParquetWriter(sink, schema)
+    try:
+        for batch in batches:
+            writer.write_table(pa.Table.from_pylist(batch, schema=schema))
+            yield sink.drain()
+    finally:
+        writer.close()
+    yield sink.drain()
+
+
+def gzip_chunks(chunks):
+    compressor = zlib.compressobj(wbits=31)
+    for chunk in chunks:
+        data = compressor.compress(chunk)
+        if data:
+            yield data
+    yield compressor.flush()
+
+
+def export_stream(db, stock_type, symbols, file_format='csv', start_date=None, end_date=None, gzip=False):
+    """Return (chunk iterator, content type, filename) for an export request."""
+    if file_format not in CONTENT_TYPES:
+        raise ValueError(f"Unsupported export format: {file_format}")
+    cursor = export_cursor(db, stock_type, symbols, start_date, end_date)
+    writers = {'csv': csv_chunks, 'ndjson': ndjson_chunks, 'parquet': parquet_chunks}
+    chunks = writers[file_format](iter_batches(db, cursor, symbols))
+    filename = f"{'_'.join(symbols) if len(symbols) <= 5 else f'{len(symbols)}_symbols'}_{stock_type}_data.{file_format}"
+    if gzip:
+        return gzip_chunks(chunks), 'application/gzip', filename + '.gz'
+    return chunks, CONTENT_TYPES[file_format], filename
@@ -0,0 +1,86 @@
+"""Per-stage breakdown of the task metrics recorded for a DAG run.
+
+    python scripts/metrics_report.py --uri "mongodb+srv://..." [--database finance_metadata] [--run-id RUN_ID]
+
+Without --run-id the most recently finished run is reported. Mapped task
+instances (one per shard) are summed into a single row per task.
+"""
+import argparse
+import os
+import sys
+
+from pymongo import MongoClient
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'dags'))
+from finance_etl.metrics import HTTP_BUCKETS, METRICS_COLLECTION
+
+
+def http_quantile(buckets, quantile):
+    """Upper bound of the histogram bucket holding `quantile` of the requests."""
+    total = sum(buckets)
+    if not total:
+        return None
+    seen = 0
+    for bound, count in zip(HTTP_BUCKETS, buckets):
+        seen += count
+        if seen >= quantile * total:
+            return bound
+
+
+def summarize(records):
+    stages = {}
+    for record in records:
+        stage = stages.setdefault(record['task_id'], {
+            'instances': 0, 'failed': 0, 'wall': 0.0, 'cpu': 0.0, 'in': 0, 'out': 0, 'xcom': 0,
+            'rss': 0.0, 'http': 0, 'http_seconds': 0.0, 'buckets': [0] * len(HTTP_BUCKETS),
+            'mongo_documents': 0, 'mongo_seconds': 0.0
+        })
+        stage['instances'] += 1
+        stage['failed'] += record['state'] != 'success'
+        stage['wall'] += record['wall_seconds']
+        stage['cpu'] += record['cpu_seconds']
+        stage['in'] += record.get('records_in') or 0
+        stage['out'] += record.get('records_out') or 0
+        stage['xcom'] += record.get('xcom_bytes') or 0
+        stage['rss'] = max(stage['rss'], record['peak_rss_mb'])
+        stage['http'] += record['http']['count']
+        stage['http_seconds'] += record['http']['sum']
+        stage['buckets'] = [a + b for a, b in zip(stage['buckets'], record['http']['buckets'])]
+        stage['mongo_documents'] += record['counters'].get('mongo_documents', 0)
+        stage['mongo_seconds'] += record['counters'].get('mongo_write_seconds', 0.0)
+    return stages
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--uri', required=True)
+    parser.add_argument('--database', default='finance_metadata')
+    parser.add_argument('--run-id')
+    args = parser.parse_args()
+
+    collection = MongoClient(args.uri).get_database(args.database)[METRICS_COLLECTION]
+    run_id = args.run_id
+    if run_id is None:
+        latest = collection.find_one({}, {'run_id': 1}, sort=[('finished_at', -1)])
+        if latest is None:
+            sys.exit("No task metrics recorded yet")
+        run_id = latest['run_id']
+    stages = summarize(collection.find({'run_id': run_id}).sort('finished_at', 1))
+    total_wall = sum(stage['wall'] for stage in stages.values()) or 1.0
+
+    print(f"run {run_id}")
+    print(f"{'task':<34} {'n':>3} {'fail':>4} {'wall s':>9} {'%':>5} {'cpu s':>9} {'rows in':>10} "
+          f"{'rows out':>10} {'xcom B':>8} {'rss MB':>8} {'http':>6} {'p50 s':>6} {'p95 s':>6} {'docs/s':>9}")
+    for task_id, stage in stages.items():
+        p50 = http_quantile(stage['buckets'], 0.5)
+        p95 = http_quantile(stage['buckets'], 0.95)
+        rate = stage['mongo_documents'] / stage['mongo_seconds'] if stage['mongo_seconds'] else None
+        print(f"{task_id:<34} {stage['instances']:>3} {stage['failed']:>4} {stage['wall']:>9.2f} "
+              f"{100 * stage['wall'] / total_wall:>5.1f} {stage['cpu']:>9.2f} {stage['in']:>10} {stage['out']:>10} "
+              f"{stage['xcom']:>8} {stage['rss']:>8.0f} {stage['http']:>6} "
+              f"{'' if p50 is None else p50:>6} {'' if p95 is None else p95:>6} "
+              f"{'' if rate is None else f'{rate:.0f}':>9}")
+
+
+if __name__ == '__main__':
+    main()
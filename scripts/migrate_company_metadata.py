@@ -0,0 +1,30 @@
+"""Move the per-row company metadata of existing stocks_* collections into company_metadata.
+
+    python scripts/migrate_company_metadata.py --uri "mongodb+srv://..." [--database finance_metadata]
+
+Safe to rerun: documents that are already slim are left untouched.
+"""
+import argparse
+import os
+import sys
+
+from pymongo import MongoClient
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'dags'))
+from finance_etl.metadata import migrate_collection
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--uri', required=True)
+    parser.add_argument('--database', default='finance_metadata')
+    args = parser.parse_args()
+
+    db = MongoClient(args.uri).get_database(args.database)
+    for name in sorted(db.list_collection_names()):
+        if name.startswith('stocks_'):
+            print(f"{name}: {migrate_collection(db, name)}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,34 @@
+"""Convert the string dates of existing stocks_* collections to BSON dates.
+
+    python scripts/migrate_typed_dates.py --uri "mongodb+srv://..." [--database finance_metadata]
+
+Run once before the first load with typed dates, so incremental upserts find
+the documents already stored. Safe to rerun: converted documents are skipped.
+Collections are not turned into time-series collections here; run the DAG
+with {"full_refresh": true} and ETL_TIMESERIES_COLLECTIONS=1 for that.
+"""
+import argparse
+import os
+import sys
+
+from pymongo import MongoClient
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'dags'))
+from finance_etl.load import ensure_collection, migrate_dates
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--uri', required=True)
+    parser.add_argument('--database', default='finance_metadata')
+    args = parser.parse_args()
+
+    db = MongoClient(args.uri).get_database(args.database)
+    for name in sorted(db.list_collection_names()):
+        if name.startswith('stocks_') and not name.endswith('__staging'):
+            print(f"{name}: {migrate_dates(db, name)}")
+            ensure_collection(db, name)
+
+
+if __name__ == '__main__':
+    main()
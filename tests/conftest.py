@@ -0,0 +1,14 @@
+import atexit
+import os
+import shutil
+import sys
+import tempfile
+
+# The DAG helpers are imported the way the Airflow DAG processor finds them, from dags/
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'dags'))
+
+# Airflow reads its home on import, so tests that run the DAG get a throwaway one with its own metadata database
+AIRFLOW_HOME = tempfile.mkdtemp(prefix='etl_tests_airflow_')
+atexit.register(shutil.rmtree, AIRFLOW_HOME, ignore_errors=True)
+os.environ['AIRFLOW_HOME'] = AIRFLOW_HOME
+os.environ['AIRFLOW__CORE__LOAD_EXAMPLES'] = 'False'
@@ -0,0 +1,65 @@
+"""The scheduler re-parses the DAG file constantly, so parsing must be quick and touch no network."""
+import importlib.util
+import json
+import os
+import socket
+import subprocess
+import sys
+
+import pytest
+
+pytest.importorskip('airflow')
+
+DAGS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'dags')
+DAG_FILE = os.path.join(DAGS_DIR, 'etl_new_dag.py')
+MAX_COLD_PARSE_SECONDS = 0.5
+# Task dependencies the DAG file must leave to the tasks
+HEAVY_MODULES = ['pandas', 'numpy', 'pyarrow', 'bs4']
+
+# Run in a fresh interpreter, so every import the DAG file pays for is timed. Like the DAG processor it has
+# Airflow's DAG authoring API loaded and the DAG folder on sys.path before it parses the file.
+COLD_PARSE = """
+import importlib.util, json, sys, time
+import airflow.decorators
+dag_file, dags_dir, heavy = sys.argv[1], sys.argv[2], sys.argv[3:]
+sys.path.insert(0, dags_dir)
+spec = importlib.util.spec_from_file_location('etl_dag_cold_parse', dag_file)
+module = importlib.util.module_from_spec(spec)
+start = time.perf_counter()
+spec.loader.exec_module(module)
+seconds = time.perf_counter() - start
+print(json.dumps({'seconds': seconds, 'imported': sorted(name for name in heavy if name in sys.modules)}))
+"""
+
+
+@pytest.fixture
+def network_calls(monkeypatch):
+    """Fail socket connections and DNS lookups, recording every attempt: libraries may retry or swallow errors."""
+    calls = []
+
+    def blocked(name):
+        def fail(*args, **kwargs):
+            calls.append(name)
+            raise OSError(f"socket {name} called while parsing the DAG file")
+        return fail
+
+    # dnspython queries resolvers over UDP without connecting, hence sendto
+    for name in ['connect', 'connect_ex', 'sendto']:
+        monkeypatch.setattr(socket.socket, name, blocked(name))
+    for name in ['getaddrinfo', 'create_connection']:
+        monkeypatch.setattr(socket, name, blocked(name))
+    return calls
+
+
+def test_dag_file_parses_without_network(network_calls):
+    spec = importlib.util.spec_from_file_location('etl_dag_parse', DAG_FILE)
+    spec.loader.exec_module(importlib.util.module_from_spec(spec))
+    assert network_calls == []
+
+
+def test_cold_dag_parse_is_quick_and_leaves_heavy_imports_to_tasks():
+    output = subprocess.run([sys.executable, '-c', COLD_PARSE, DAG_FILE, DAGS_DIR] + HEAVY_MODULES,
+                            check=True, capture_output=True, text=True).stdout
+    parse = json.loads(output.strip().splitlines()[-1])
+    assert parse['imported'] == []
+    assert parse['seconds'] < MAX_COLD_PARSE_SECONDS, parse
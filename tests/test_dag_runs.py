@@ -0,0 +1,140 @@
+"""The DAG run end to end on mongomock, with prices served from replay fixtures."""
+import itertools
+import json
+import math
+import os
+import random
+from datetime import date, timedelta
+
+import pytest
+
+pytest.importorskip('airflow')
+mongomock = pytest.importorskip('mongomock')
+import pendulum  # noqa: E402  installed with Airflow
+
+SYMBOLS = ['AAPL', 'IBM', 'MSFT']
+BARS = 420
+# Bars served to each run of an incremental sequence; the last run sees them all
+RUN_BARS = [BARS - 30, BARS - 12, BARS]
+COMPARED = ['stocks_daily', 'stocks_weekly', 'stocks_monthly', 'stocks_quarterly', 'stocks_yearly',
+            'stocks_indicators', 'etl_watermarks']
+# Every run of the DAG needs its own logical date
+LOGICAL_DATES = (pendulum.datetime(2024, 1, 1, tz='UTC').add(hours=hours) for hours in itertools.count())
+
+
+def daily_series(symbol, bars):
+    """The first `bars` weekdays of a deterministic Alpha Vantage series, newest first."""
+    rng = random.Random(symbol)
+    day = date(2023, 3, 1)
+    price = 100.0
+    series = {}
+    while len(series) < bars:
+        if day.weekday() < 5:
+            close = price * (1 + rng.gauss(0, 0.02))
+            series[day.isoformat()] = {
+                '1. open': f'{price:.2f}',
+                '2. high': f'{max(price, close) * 1.01:.2f}',
+                '3. low': f'{min(price, close) * 0.99:.2f}',
+                '4. close': f'{close:.2f}',
+                '5. volume': str(rng.randint(1, 10 ** 6)),
+            }
+            price = close
+        day += timedelta(days=1)
+    return dict(reversed(series.items()))
+
+
+@pytest.fixture(scope='module')
+def dag():
+    from airflow.utils import db
+    db.initdb()
+    import etl_new_dag
+    return etl_new_dag.etl_finance_meta()
+
+
+@pytest.fixture
+def pipeline(dag, tmp_path, monkeypatch):
+    """Returns a factory of runners, each running the DAG against its own mongomock database.
+
+    A runner serves the first `bars` bars of every symbol through replay
+    fixtures and returns the database once the run has succeeded.
+    """
+    import etl_new_dag
+    from finance_etl import artifacts, mongo
+
+    monkeypatch.setenv('ETL_SYMBOLS', ','.join(SYMBOLS))
+    monkeypatch.setattr(etl_new_dag, 'METADATA_PROVIDER', 'none')
+    monkeypatch.setattr(mongo, '_client_pid', os.getpid())
+
+    def new_runner(name):
+        client = mongomock.MongoClient()
+        fixtures = tmp_path / name / 'fixtures'
+        os.makedirs(fixtures / 'daily')
+
+        def run(bars, full_refresh=False):
+            for symbol in SYMBOLS:
+                with open(fixtures / 'daily' / f'{symbol}.json', 'w') as f:
+                    json.dump(daily_series(symbol, bars), f)
+            monkeypatch.setattr(etl_new_dag, 'PRICE_PROVIDER', f'replay:{fixtures}')
+            monkeypatch.setattr(artifacts, 'ARTIFACT_ROOT', str(tmp_path / name / 'artifacts'))
+            monkeypatch.setattr(mongo, '_client', client)
+            dag_run = dag.test(execution_date=next(LOGICAL_DATES), run_conf={'full_refresh': full_refresh})
+            assert dag_run.state == 'success', {ti.task_id: ti.state for ti in dag_run.get_task_instances()}
+            return mongo.get_database()
+
+        return run
+
+    return new_runner
+
+
+def _value(value):
+    if isinstance(value, float):
+        return None if math.isnan(value) else round(value, 6)
+    return value
+
+
+def collections(db):
+    """Every compared collection as sorted documents, without generated ids."""
+    dumped = {}
+    for name in COMPARED:
+        docs = [{key: _value(value) for key, value in doc.items() if key != '_id' or isinstance(value, str)}
+                for doc in db[name].find()]
+        dumped[name] = sorted(docs, key=lambda doc: repr(sorted(doc.items())))
+    return dumped
+
+
+@pytest.mark.parametrize('dropped', [None, 'stocks_quarterly', 'stocks_indicators'])
+def test_incremental_runs_match_a_fresh_load(pipeline, dropped):
+    expected = collections(pipeline('fresh')(BARS, full_refresh=True))
+
+    run = pipeline('incremental')
+    for index, bars in enumerate(RUN_BARS):
+        db = run(bars)
+        if dropped and index == 0:
+            # A dropped collection, like a period added to PERIODS, is rebuilt by the next run
+            db[dropped].drop()
+    loaded = collections(db)
+
+    for name in COMPARED:
+        assert len(loaded[name]) == len(expected[name]), name
+        assert loaded[name] == expected[name], name
+
+
+def test_record_run_removes_the_artifacts_of_failed_shards(pipeline, monkeypatch, tmp_path):
+    import etl_new_dag
+    from finance_etl import load
+
+    load_records = load.load_records
+
+    def failing_for_ibm(db, name, records, **kwargs):
+        records = list(records)
+        if name == 'stocks_weekly' and any(record['Symbol'] == 'IBM' for record in records):
+            raise RuntimeError('weekly load failed')
+        return load_records(db, name, records, **kwargs)
+
+    monkeypatch.setattr(etl_new_dag, 'SHARD_SIZE', 1)
+    monkeypatch.setattr(load, 'load_records', failing_for_ibm)
+    # record_run and publish_snapshots still succeed, and so does the run
+    db = pipeline('failed')(BARS)
+
+    assert db.etl_runs.find_one()['missing'] == ['IBM']
+    assert os.listdir(tmp_path / 'failed' / 'artifacts') == []
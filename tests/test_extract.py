@@ -0,0 +1,120 @@
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+import pytest
+
+from finance_etl.extract import RetryableError, TokenBucket, fetch_all, fetch_daily_series, make_session
+
+SERIES = {
+    '2024-07-02': {'1. open': '216.00', '2. high': '220.38', '3. low': '215.10', '4. close': '220.27',
+                   '5. volume': '58046178'},
+    '2024-07-01': {'1. open': '212.09', '2. high': '217.51', '3. low': '211.92', '4. close': '216.75',
+                   '5. volume': '60402929'},
+}
+DAILY = (200, {'Time Series (Daily)': SERIES})
+THROTTLED = (200, {'Note': 'Thank you for using Alpha Vantage! Our standard API call frequency is 5 calls per minute.'})
+INVALID = (200, {'Error Message': 'Invalid API call. Please retry or visit the documentation.'})
+
+
+class AlphaVantageStub:
+    """Answers /query with scripted (status, body) replies per symbol; the last reply repeats."""
+
+    def __init__(self, replies):
+        self.replies = replies
+        self.requests = []
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                symbol = parse_qs(urlparse(self.path).query)['symbol'][0]
+                server.requests.append(symbol)
+                script = server.replies[symbol]
+                status, body = script.pop(0) if len(script) > 1 else script[0]
+                payload = json.dumps(body).encode()
+                self.send_response(status)
+                self.send_header('Content-Type', 'application/json')
+                self.send_header('Content-Length', str(len(payload)))
+                self.end_headers()
+                self.wfile.write(payload)
+
+            def log_message(self, *args):
+                pass
+
+        self.httpd = ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+        self.url = f"http://127.0.0.1:{self.httpd.server_port}/query"
+        threading.Thread(target=self.httpd.serve_forever, daemon=True).start()
+
+    def close(self):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+
+@pytest.fixture
+def stub():
+    servers = []
+
+    def start(replies):
+        servers.append(AlphaVantageStub(replies))
+        return servers[-1]
+
+    yield start
+    for server in servers:
+        server.close()
+
+
+@pytest.fixture
+def session():
+    with make_session() as session:
+        yield session
+
+
+def test_token_bucket_allows_a_burst_then_paces_at_the_rate():
+    bucket = TokenBucket(rate_per_minute=600, burst=2)
+    start = time.monotonic()
+    for _ in range(4):
+        bucket.acquire()
+    # Two tokens up front, then one every 0.1 s
+    assert 0.18 <= time.monotonic() - start < 0.5
+
+
+@pytest.mark.parametrize('reply', [THROTTLED, (429, {}), (503, {})], ids=['note', '429', '503'])
+def test_fetch_daily_series_retries_throttling_and_server_errors(stub, session, reply):
+    server = stub({'AAPL': [reply, reply, DAILY]})
+    assert fetch_daily_series(session, 'AAPL', 'key', url=server.url, backoff_base=0) == SERIES
+    assert server.requests == ['AAPL'] * 3
+
+
+def test_fetch_daily_series_gives_up_after_max_retries(stub, session):
+    server = stub({'AAPL': [(503, {})]})
+    with pytest.raises(RetryableError, match='HTTP 503'):
+        fetch_daily_series(session, 'AAPL', 'key', url=server.url, max_retries=2, backoff_base=0)
+    assert len(server.requests) == 3
+
+
+def test_fetch_daily_series_does_not_retry_error_messages(stub, session):
+    server = stub({'NOPE': [INVALID, DAILY]})
+    with pytest.raises(ValueError, match='Invalid API call'):
+        fetch_daily_series(session, 'NOPE', 'key', url=server.url, backoff_base=0)
+    assert server.requests == ['NOPE']
+
+
+def test_fetch_all_keeps_the_symbols_that_succeeded(stub):
+    server = stub({'AAPL': [DAILY], 'IBM': [THROTTLED, DAILY], 'NOPE': [INVALID]})
+    data, errors, modes = fetch_all(['AAPL', 'IBM', 'NOPE'], api_key='key', max_workers=3, calls_per_minute=6000,
+                                    burst=3, url=server.url, backoff_base=0)
+    assert data == {'AAPL': SERIES, 'IBM': SERIES}
+    assert modes == {'AAPL': 'full', 'IBM': 'full'}
+    assert list(errors) == ['NOPE']
+    assert 'Invalid API call' in errors['NOPE']
+
+
+def test_fetch_all_fetches_only_bars_after_the_watermark(stub):
+    server = stub({'AAPL': [DAILY]})
+    data, errors, modes = fetch_all(['AAPL'], api_key='key', calls_per_minute=6000, url=server.url,
+                                    watermarks={'AAPL': '2024-07-01'})
+    assert data == {'AAPL': {'2024-07-02': SERIES['2024-07-02']}}
+    assert modes == {'AAPL': 'incremental'}
+    assert errors == {}
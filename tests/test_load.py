@@ -0,0 +1,82 @@
+import threading
+import time
+from datetime import datetime
+
+import pytest
+
+from finance_etl.load import _submit_batches, publish_staging, stage_records, staging_name, upsert_records
+
+mongomock = pytest.importorskip('mongomock')
+
+
+def records(closes):
+    return [{'Symbol': symbol, 'Date': datetime(2024, 7, day), 'Close': close}
+            for symbol in ['AAPL', 'IBM'] for day, close in enumerate(closes, start=1)]
+
+
+def documents(collection):
+    return documents_of(collection.find())
+
+
+def documents_of(rows):
+    return sorted((row['Symbol'], row['Date'], row['Close']) for row in rows)
+
+
+@pytest.fixture
+def db():
+    return mongomock.MongoClient().get_database('finance_metadata')
+
+
+def test_upsert_records_rerun_modifies_nothing(db):
+    assert upsert_records(db.stocks_daily, records([1.0, 2.0, 3.0]), batch_size=2) == \
+        {'matched': 0, 'modified': 0, 'upserted': 6}
+    assert upsert_records(db.stocks_daily, records([1.0, 2.0, 3.0]), batch_size=2) == \
+        {'matched': 6, 'modified': 0, 'upserted': 0}
+    # Only documents whose values changed are rewritten
+    assert upsert_records(db.stocks_daily, records([1.0, 2.0, 3.5]), batch_size=2) == \
+        {'matched': 6, 'modified': 2, 'upserted': 0}
+    assert len(documents(db.stocks_daily)) == 6
+
+
+def test_stage_records_is_idempotent_on_retry(db):
+    assert stage_records(db, 'stocks_daily', records([1.0, 2.0]), batch_size=3) == {'staged': 4}
+    # A retried loader stages the same documents again
+    assert stage_records(db, 'stocks_daily', records([1.0, 2.0]), batch_size=3) == {'staged': 4}
+    assert documents(db[staging_name('stocks_daily')]) == documents_of(records([1.0, 2.0]))
+    assert 'stocks_daily' not in db.list_collection_names()
+
+
+def test_publish_staging_renames_over_the_live_collection(db):
+    upsert_records(db.stocks_daily, records([1.0, 2.0, 3.0]))
+    stage_records(db, 'stocks_daily', records([9.0, 8.0]))
+
+    assert publish_staging(db, 'stocks_daily')
+    assert documents(db.stocks_daily) == documents_of(records([9.0, 8.0]))
+    assert staging_name('stocks_daily') not in db.list_collection_names()
+    # Nothing left to publish
+    assert not publish_staging(db, 'stocks_daily')
+
+
+def test_submit_batches_bounds_the_batches_in_flight():
+    max_workers = 2
+    release = threading.Event()
+    built = []
+
+    def batches():
+        for index in range(20):
+            built.append(index)
+            yield [index]
+
+    def write(batch):
+        release.wait(5)
+        return batch[0]
+
+    results = []
+    consumer = threading.Thread(target=lambda: results.extend(_submit_batches(write, batches(), max_workers)))
+    consumer.start()
+    time.sleep(0.2)
+    # 2 * max_workers submitted batches, plus the one waiting for a free slot
+    assert len(built) == 2 * max_workers + 1
+    release.set()
+    consumer.join(5)
+    assert results == list(range(20))
@@ -0,0 +1,119 @@
+import os
+import threading
+from email.utils import formatdate
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+from finance_etl.extract import make_session
+from finance_etl.scrape import fetch_all_metadata, fetch_metadata, parse_quote_page
+
+PAGES = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'fixtures', 'yahoo')
+AAPL_FIELDS = {
+    'Company Name': 'Apple Inc. (AAPL)',
+    'Previous Close': '214.10',
+    'Open': '215.77',
+    'Market Cap': '3.23T',
+    'Beta (5Y Monthly)': '1.25',
+    'PE Ratio (TTM)': '32.75',
+    'EPS (TTM)': '6.43',
+    'Earnings Date': 'Aug 01, 2024',
+    'Forward Dividend & Yield': '1.00 (0.47%)',
+    'Ex-Dividend Date': 'May 10, 2024',
+    '1y Target Est': '222.38',
+}
+
+
+def read_page(name):
+    with open(os.path.join(PAGES, name), 'rb') as f:
+        return f.read()
+
+
+class QuoteServer:
+    """Serves the saved pages at /quote/<symbol>/ with validators, answering matching revalidations with 304."""
+
+    def __init__(self):
+        self.requests = []
+        self.etag = '"v1"'
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                server.requests.append((self.path, dict(self.headers)))
+                path = os.path.join(PAGES, self.path.strip('/').split('/')[-1] + '.html')
+                if not os.path.exists(path):
+                    self.send_response(404)
+                    self.end_headers()
+                    return
+                if self.headers.get('If-None-Match') == server.etag:
+                    self.send_response(304)
+                    self.end_headers()
+                    return
+                body = read_page(path)
+                self.send_response(200)
+                self.send_header('Content-Type', 'text/html; charset=utf-8')
+                self.send_header('Content-Length', str(len(body)))
+                self.send_header('ETag', server.etag)
+                self.send_header('Last-Modified', formatdate(usegmt=True))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, *args):
+                pass
+
+        self.httpd = ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+        self.url_template = f"http://127.0.0.1:{self.httpd.server_port}/quote/{{symbol}}/"
+        threading.Thread(target=self.httpd.serve_forever, daemon=True).start()
+
+    def close(self):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+
+@pytest.fixture
+def server():
+    quotes = QuoteServer()
+    yield quotes
+    quotes.close()
+
+
+@pytest.fixture
+def session():
+    with make_session() as session:
+        yield session
+
+
+def test_parse_quote_page_reads_name_and_summary_tables():
+    assert parse_quote_page(read_page('AAPL.html')) == AAPL_FIELDS
+
+
+def test_parse_quote_page_without_quote_is_empty():
+    assert parse_quote_page(read_page('LOOKUP.html')) == {}
+
+
+def test_fetch_metadata_serves_fresh_entries_from_cache(server, session, tmp_path):
+    first = fetch_metadata(session, 'AAPL', str(tmp_path), ttl=3600, url_template=server.url_template)
+    second = fetch_metadata(session, 'AAPL', str(tmp_path), ttl=3600, url_template=server.url_template)
+    assert first == (AAPL_FIELDS, 'fetched')
+    assert second == (AAPL_FIELDS, 'cache')
+    assert len(server.requests) == 1
+
+
+def test_fetch_metadata_revalidates_expired_entries(server, session, tmp_path):
+    fetch_metadata(session, 'AAPL', str(tmp_path), ttl=0, url_template=server.url_template)
+    assert fetch_metadata(session, 'AAPL', str(tmp_path), ttl=0, url_template=server.url_template) == \
+        (AAPL_FIELDS, 'not-modified')
+    headers = server.requests[1][1]
+    assert headers['If-None-Match'] == '"v1"'
+    assert 'If-Modified-Since' in headers
+
+    # A changed page is parsed again
+    server.etag = '"v2"'
+    assert fetch_metadata(session, 'AAPL', str(tmp_path), ttl=0, url_template=server.url_template) == \
+        (AAPL_FIELDS, 'fetched')
+
+
+def test_fetch_all_metadata_maps_failed_symbols_to_none(server, tmp_path):
+    meta = fetch_all_metadata(['AAPL', 'MISSING'], max_workers=2, cache_dir=str(tmp_path),
+                              url_template=server.url_template)
+    assert meta == {'AAPL': AAPL_FIELDS, 'MISSING': None}